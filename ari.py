@@ -0,0 +1,186 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import logging
+import os
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import bindparam, func, text
+from sqlalchemy.dialects.mysql import insert
+
+from controllers import AuthenticatedDatabaseController
+from models import RoomType, Inventory
+from registry import register
+
+logger = logging.getLogger(__name__)
+
+if 'logging_level' in os.environ:
+    logger.setLevel(os.environ['logging_level'])
+else:
+    logger.setLevel('INFO')
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value in (0, 1, '0', '1'):
+        return bool(int(value))
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    raise ValueError('Not a boolean: {0}'.format(value))
+
+
+def parse_rate(value):
+    rate = Decimal(str(value))
+    if not rate.is_finite() or rate < 0:
+        raise ValueError('Not a rate: {0}'.format(value))
+    return rate
+
+
+# Inventory columns an ARIUpdate entry may set, with their parsers. Columns an entry leaves out
+# keep their stored values.
+INVENTORY_FIELDS = OrderedDict([
+    ('units', int),
+    ('rate', parse_rate),
+    ('min_los', int),
+    ('max_los', int),
+    ('closed', parse_bool),
+    ('closed_arrival', parse_bool),
+    ('closed_departure', parse_bool)
+])
+
+# Entry fields the Build-To-Us spec names differently from their inventory columns. The column name
+# is accepted as well.
+FIELD_NAMES = {'rate': 'price'}
+
+
+def entry_value(entry, name):
+    value = entry.get(FIELD_NAMES.get(name, name))
+    return entry.get(name) if value is None else value
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def expand_inventory(updates):
+    """
+    Expands (room_type_id, start_date, end_date, values) ranges into one row per room type and date,
+    ordered by key. Later ranges override the fields they set on dates an earlier range covered.
+    """
+    merged = {}
+    for room_type_id, start_date, end_date, values in updates:
+        for offset in range((end_date - start_date).days + 1):
+            key = (room_type_id, start_date + timedelta(days=offset))
+            row = merged.get(key)
+            if row is None:
+                merged[key] = dict(values)
+            else:
+                row.update(values)
+    rows = []
+    for room_type_id, dt in sorted(merged):
+        row = {'room_type_id': room_type_id, 'dt': dt}
+        for name in INVENTORY_FIELDS:
+            row[name] = merged[(room_type_id, dt)].get(name)
+        rows.append(row)
+    return rows
+
+
+def upsert_statement():
+    """
+    INSERT ... ON DUPLICATE KEY UPDATE that leaves NULL (omitted) fields untouched. Executed with a
+    list of rows, SQLAlchemy compiles it once and mysqlconnector sends the whole list as a single
+    multi-row INSERT, which is far cheaper than compiling a VALUES clause per batch.
+    """
+    statement = insert(Inventory.__table__)
+    return statement.on_duplicate_key_update(OrderedDict(
+        (name, func.coalesce(statement.inserted[name], Inventory.__table__.c[name])) for name in INVENTORY_FIELDS))
+
+
+def sqlite_upsert_statement():
+    """The same upsert for the SQLite stand-in database, which spells it ON CONFLICT ... DO UPDATE."""
+    columns = ['room_type_id', 'dt'] + list(INVENTORY_FIELDS)
+    return text('INSERT INTO inventory ({0}) VALUES ({1}) ON CONFLICT (room_type_id, dt) DO UPDATE SET {2}'.format(
+        ', '.join(columns), ', '.join(':' + name for name in columns),
+        ', '.join('{0} = coalesce(excluded.{0}, inventory.{0})'.format(name) for name in INVENTORY_FIELDS))).\
+        bindparams(*[bindparam(name, type_=Inventory.__table__.c[name].type) for name in columns])
+
+
+UPSERT = upsert_statement()
+SQLITE_UPSERT = sqlite_upsert_statement()
+
+
+@register('ARIUpdate')
+class ARIUpdateController(AuthenticatedDatabaseController):
+    """
+    Stores availability, rates and restrictions pushed by MyAllocator. Each Inventory entry covers a
+    room type over an inclusive date range; the expanded rows are written in batches of multi-row
+    upserts ordered by key.
+    """
+
+    MA_OTA_PARAM_INVENTORY = 'Inventory'
+
+    batch_size = int(os.environ.get('ARI_BATCH_SIZE', 1000))
+    max_days = int(os.environ.get('ARI_MAX_DAYS', 731))
+
+    def __init__(self, body):
+        super(ARIUpdateController, self).__init__(body)
+        self.updates = []
+        if not self.is_error():
+            self.add_required(self.MA_OTA_PARAM_INVENTORY)
+
+    def validate(self):
+        if not super(ARIUpdateController, self).validate():
+            return False
+        try:
+            for entry in self.body[self.MA_OTA_PARAM_INVENTORY]:
+                start_date = parse_date(entry['start_date'])
+                end_date = parse_date(entry['end_date'])
+                if not 0 <= (end_date - start_date).days < self.max_days:
+                    raise ValueError('Invalid date range {0} to {1}'.format(start_date, end_date))
+                values = dict((name, parser(entry_value(entry, name))) for name, parser in INVENTORY_FIELDS.items()
+                              if entry_value(entry, name) is not None)
+                self.updates.append((str(entry['ota_room_id']), start_date, end_date, values))
+        except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+            self.add_error('Invalid or missing Api arguments')
+            logger.error('Invalid Inventory entry: {0}'.format(e))
+            return False
+        return True
+
+    def perform_action(self):
+        super(ARIUpdateController, self).perform_action()
+        if not self.is_error():
+            room_type_ids = set(room_type_id for room_type_id, start_date, end_date, values in self.updates)
+            owned = set()
+            if room_type_ids:
+                owned = set(row[0] for row in self.session.query(RoomType.id).
+                            filter(RoomType.user_id == self.body['ota_property_id']).
+                            filter(RoomType.id.in_(list(room_type_ids))))
+            if owned != room_type_ids:
+                self.add_error('Unknown room type')
+                logger.error('Unknown room types: {0}'.format(', '.join(sorted(room_type_ids - owned))))
+                return
+
+            rows = expand_inventory(self.updates)
+            upsert = SQLITE_UPSERT if self.session.get_bind().dialect.name == 'sqlite' else UPSERT
+            for start in range(0, len(rows), self.batch_size):
+                self.session.execute(upsert, rows[start:start + self.batch_size])
+            self._data['ota_property_id'] = self.body['ota_property_id']
@@ -0,0 +1,135 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import logging
+import os
+import traceback
+
+import metrics
+
+from deadline import DeadlineExceeded
+from encoder import dumps
+
+logger = logging.getLogger(__name__)
+
+if 'logging_level' in os.environ:
+    logger.setLevel(os.environ['logging_level'])
+else:
+    logger.setLevel('INFO')
+
+MA_OTA_PARAM_VERB = 'verb'
+
+
+class BaseController(object):
+
+    MA_OTA_PARAM_MYA_PROPERTY_ID = 'mya_property_id'
+    MA_OTA_PARAM_OTA_PROPERTY_ID = 'ota_property_id'
+    MA_OTA_PARAM_SHARED_SECRET = 'shared_secret'
+
+    MA_OTA_SUCCESS = 'success'
+    MA_OTA_TYPE = 'type'
+    MA_OTA_MSG = 'msg'
+
+    def __init__(self, body):
+
+        self.body = body
+        self._errors = []
+        self._data = {}
+        self._required_params = [
+            MA_OTA_PARAM_VERB,
+            self.MA_OTA_PARAM_MYA_PROPERTY_ID,
+            self.MA_OTA_PARAM_OTA_PROPERTY_ID
+        ]
+
+        # Securely removing the shared secret
+        shared_secret = self.body.pop(self.MA_OTA_PARAM_SHARED_SECRET, None)
+
+        # Validate the shared secret.
+        if shared_secret != os.environ[self.MA_OTA_PARAM_SHARED_SECRET]:
+            self._errors.append({
+                self.MA_OTA_TYPE: 'api',
+                self.MA_OTA_MSG: 'Invalid or missing authentication arguments'
+            })
+
+        # Logging the payload before handlers.
+        if logger.getEffectiveLevel() == logging.DEBUG:
+            logger.debug(json.dumps(self.body))
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def validate(self):
+        for param in self._required_params:
+            if param not in self.body:
+                self._errors.append({
+                    self.MA_OTA_TYPE: 'api',
+                    self.MA_OTA_MSG: 'Invalid or missing Api arguments'
+                })
+                logger.error('Request missing a parameter: {0}'.format(param))
+                return False
+        return True
+
+    def is_error(self):
+        return len(self._errors) > 0
+
+    def add_error(self, error_msg):
+        self._data[self.MA_OTA_SUCCESS] = False
+        self._errors.append({
+            self.MA_OTA_TYPE: 'api',
+            self.MA_OTA_MSG: error_msg
+        })
+
+    def add_required(self, param):
+        self._required_params.append(param)
+
+    def perform_action(self):
+        pass
+
+    def handle(self):
+
+        with self:
+            try:
+                with metrics.timed('validate'):
+                    self.validate()
+                if not self.is_error():
+                    with metrics.timed('action'):
+                        self.perform_action()
+            except DeadlineExceeded as e:
+                self.add_error('Request timed out')
+                logger.warning('Deadline exceeded: {0}'.format(e))
+            except Exception as e:
+                self.add_error('Generic error')
+                logger.error(traceback.format_exc())
+
+        # Adding the errors to the array
+        if self.is_error():
+            self._data[self.MA_OTA_SUCCESS] = False
+            self._data['errors'] = self._errors
+        else:
+            self._data[self.MA_OTA_SUCCESS] = True
+
+        # Logging the return payload
+        if logger.getEffectiveLevel() == logging.DEBUG:
+            logger.debug('Response is: ' + dumps(self._data))
+
+        with metrics.timed('serialize'):
+            return dumps(self._data)
@@ -0,0 +1,99 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import logging
+import os
+
+import registry
+
+from base import MA_OTA_PARAM_VERB
+from controllers import AuthenticatedDatabaseController
+from encoder import RawJSON
+
+logger = logging.getLogger(__name__)
+
+if 'logging_level' in os.environ:
+    logger.setLevel(os.environ['logging_level'])
+else:
+    logger.setLevel('INFO')
+
+
+@registry.register('Batch')
+class BatchController(AuthenticatedDatabaseController):
+    """
+    Several verbs for one property in a single call. The property is authenticated once, then each
+    entry of requests (a verb and its own arguments) runs in order on one session, and responses
+    holds what each would have returned on its own, success and errors included. Writing verbs run
+    in savepoints, so a failed one is undone while the rest commit together at the end; a batch of
+    read-only verbs runs on the replica.
+    """
+
+    MA_OTA_PARAM_REQUESTS = 'requests'
+
+    max_requests = int(os.environ.get('BATCH_MAX_REQUESTS', 10))
+
+    def __init__(self, body):
+        super(BatchController, self).__init__(body)
+        self.controllers = []
+        if not self.is_error():
+            self.add_required(self.MA_OTA_PARAM_REQUESTS)
+
+            # Built up front: whether any of them writes decides the session the batch opens
+            requests = body.get(self.MA_OTA_PARAM_REQUESTS)
+            if isinstance(requests, list) and all(isinstance(request, dict) for request in requests):
+                self.controllers = [self.controller_for(request) for request in requests]
+
+    def controller_for(self, request):
+        controller = registry.controller_for(request.get(MA_OTA_PARAM_VERB))
+        if not issubclass(controller, AuthenticatedDatabaseController) or issubclass(controller, BatchController):
+            return None
+
+        # Every request is for the batch's property; the shared secret was checked for the batch
+        body = dict(request)
+        for param in (self.MA_OTA_PARAM_MYA_PROPERTY_ID, self.MA_OTA_PARAM_OTA_PROPERTY_ID,
+                      'ota_property_password'):
+            if param in self.body:
+                body[param] = self.body[param]
+        body[self.MA_OTA_PARAM_SHARED_SECRET] = os.environ[self.MA_OTA_PARAM_SHARED_SECRET]
+        return controller(body)
+
+    @property
+    def read_only(self):
+        return all(controller is None or controller.read_only for controller in self.controllers)
+
+    def validate(self):
+        if not super(BatchController, self).validate():
+            return False
+        requests = self.body[self.MA_OTA_PARAM_REQUESTS]
+        if not self.controllers or len(self.controllers) != len(requests) or len(requests) > self.max_requests:
+            self.add_error('Invalid or missing Api arguments')
+            return False
+        if None in self.controllers:
+            self.add_error('Unsupported verb in batch')
+            return False
+        return True
+
+    def perform_action(self):
+        super(BatchController, self).perform_action()
+        if not self.is_error() and self.user is None:
+            self.add_error('Invalid or missing authentication arguments')
+        if not self.is_error():
+            self._data['responses'] = []
+            for controller in self.controllers:
+                controller.attach(self.session, self.user)
+                self._data['responses'].append(RawJSON(controller.handle()))
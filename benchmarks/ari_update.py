@@ -0,0 +1,103 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Duration of a large ARIUpdate.
+
+Seeds one property with room types in the database named by the DB_* environment variables
+(schema.sql already loaded, as for the tests), then pushes a day-by-day update of every room type
+with a different rate per day, as MyAllocator does for a year of seasonal pricing. The first run
+inserts every row, the second updates them.
+
+    python -m benchmarks.ari_update --days 365 --room-types 50
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+import database
+import index
+
+from controllers import DatabaseController
+from models import User, RoomType
+
+SHARED_SECRET = 'benchmark-secret'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=365, help='days of inventory per room type')
+    parser.add_argument('--room-types', type=int, default=50, help='room types of the property')
+    args = parser.parse_args()
+
+    os.environ['shared_secret'] = SHARED_SECRET
+    password = 'benchmarkpassword'
+    email = str(uuid.uuid4()) + '@benchmark.example.com'
+
+    session = DatabaseController({'shared_secret': SHARED_SECRET}).Session()
+    session.add(User(id=email, password=password))
+    session.commit()
+    room_type_ids = [str(uuid.uuid4()) for count in range(args.room_types)]
+    session.add_all([RoomType(id=room_type_id, user_id=email, title='Room ' + str(count), detail='',
+                              occupancy=2, dorm=False) for count, room_type_id in enumerate(room_type_ids)])
+    session.commit()
+    session.close()
+
+    start_date = date.today()
+    inventory = []
+    for room_type_id in room_type_ids:
+        for day in range(args.days):
+            dt = (start_date + timedelta(days=day)).isoformat()
+            inventory.append({'ota_room_id': room_type_id, 'start_date': dt, 'end_date': dt,
+                              'units': 5, 'price': '{0}.{1:02d}'.format(80 + day % 40, day % 100),
+                              'min_los': 1, 'closed': False})
+
+    statements = []
+    event.listen(database.get_engine(database.PRIMARY), 'before_cursor_execute',
+                 lambda conn, cursor, statement, parameters, context, executemany: statements.append(statement))
+
+    for run in ('insert', 'update'):
+        del statements[:]
+        started = time.perf_counter()
+        result = index.router({
+            'verb': 'ARIUpdate',
+            'mya_property_id': 'BenchmarkMyaPropertyID',
+            'ota_property_id': email,
+            'ota_property_password': password,
+            'shared_secret': SHARED_SECRET,
+            'Inventory': inventory
+        }, None)
+        elapsed = (time.perf_counter() - started) * 1000.0
+        assert json.loads(result['body'])['success'], result['body']
+        print(json.dumps({
+            'benchmark': 'ari_update',
+            'run': run,
+            'rows': len(inventory),
+            'statements': len(statements),
+            'elapsed_ms': round(elapsed, 1)
+        }))
+
+
+if __name__ == '__main__':
+    main()
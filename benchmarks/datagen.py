@@ -0,0 +1,145 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Synthetic properties for benchmarks: room types, bookings made over the past year, customers and
+multi-night booking_rooms. The same seed always produces the same data; the namespace only salts
+the keys, so one database can hold several generated sets.
+
+    python -m benchmarks.datagen --properties 10 --bookings 1000 --seed 42
+"""
+import argparse
+import json
+import random
+import uuid
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bcrypt import gensalt, hashpw
+from sqlalchemy.orm import sessionmaker
+
+import database
+
+from models import User, RoomType, Booking, Customer, BookingRoom, booking_customers
+
+GeneratedProperty = namedtuple('GeneratedProperty', ['id', 'password', 'room_type_ids', 'booking_ids'])
+
+COUNTRIES = ['US', 'CA', 'GB', 'DE', 'FR', 'ES', 'IT', 'NL', 'AU', 'JP']
+FIRST_NAMES = ['John', 'Jane', 'Maria', 'Wei', 'Ahmed', 'Olga', 'Luis', 'Aiko', 'Sam', 'Priya']
+LAST_NAMES = ['Doe', 'Smith', 'Garcia', 'Chen', 'Khan', 'Ivanova', 'Silva', 'Sato', 'Brown', 'Patel']
+
+# Rows per INSERT when loading
+CHUNK_SIZE = 1000
+
+
+class Generator(object):
+
+    def __init__(self, seed=0, namespace=None, now=None):
+        self.random = random.Random(seed)
+        self.namespace = uuid.uuid5(uuid.NAMESPACE_URL, namespace or uuid.uuid4().hex)
+        self.now = now or datetime(2018, 6, 1, 12, 0, 0)
+        self._password_hashes = {}
+
+    def key(self, kind, *parts):
+        return str(uuid.uuid5(self.namespace, '/'.join([kind] + [str(part) for part in parts])))
+
+    def password_hash(self, password):
+        # One bcrypt per distinct password keeps loading fast; the benchmarks still pay for bcrypt
+        if password not in self._password_hashes:
+            self._password_hashes[password] = hashpw(password.encode('utf-8'), gensalt()).decode()
+        return self._password_hashes[password]
+
+    def property_rows(self, number, room_types, bookings, max_nights, max_customers):
+        """Returns the rows of every table for one property, by table name, and its GeneratedProperty."""
+        rng = self.random
+        property_id = self.key('property', number) + '@benchmark.example.com'
+        password = 'benchmark-password-{0}'.format(number % 10)
+        rows = {'users': [{'id': property_id, 'password': self.password_hash(password), 'myallocator_id': None}],
+                'room_types': [], 'bookings': [], 'customers': [], 'booking_customers': [], 'booking_rooms': []}
+
+        room_type_ids = []
+        base_rates = []
+        for count in range(room_types):
+            room_type_ids.append(self.key('room_type', number, count))
+            base_rates.append(Decimal(rng.randint(40, 400)))
+            rows['room_types'].append({'id': room_type_ids[-1], 'user_id': property_id,
+                                       'title': 'Room type {0}'.format(count),
+                                       'detail': 'Generated room type {0}'.format(count),
+                                       'occupancy': rng.randint(1, 6), 'dorm': rng.random() < 0.1})
+
+        booking_ids = []
+        for count in range(bookings):
+            booking_id = self.key('booking', number, count)
+            booking_ids.append(booking_id)
+            dttm = self.now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            rows['bookings'].append({'id': booking_id, 'user_id': property_id, 'dttm': dttm.replace(microsecond=0),
+                                     'currency': 'USD', 'cancellation': rng.random() < 0.05,
+                                     'myallocator_guid': self.key('guid', number, count) if rng.random() < 0.5 else None})
+            for customer in range(rng.randint(1, max_customers)):
+                email = self.key('customer', number, count, customer) + '@example.com'
+                rows['customers'].append({'email': email, 'country': rng.choice(COUNTRIES),
+                                          'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES)})
+                rows['booking_customers'].append({'booking_id': booking_id, 'email': email})
+            arrival = dttm.date() + timedelta(days=rng.randint(1, 120))
+            nights = rng.randint(1, max_nights)
+            for room in rng.sample(range(room_types), min(room_types, rng.randint(1, 2))):
+                for night in range(nights):
+                    rows['booking_rooms'].append({
+                        'booking_id': booking_id, 'room_type_id': room_type_ids[room],
+                        'dt': arrival + timedelta(days=night), 'description': 'Night {0}'.format(night + 1),
+                        'rate': base_rates[room] + Decimal(rng.randint(0, 4000)) / 100, 'rate_id': None})
+        return rows, GeneratedProperty(property_id, password, room_type_ids, booking_ids)
+
+    def load(self, session, properties=1, room_types=5, bookings=100, max_nights=7, max_customers=2):
+        """Inserts the properties in dependency order, committing per property."""
+        generated = []
+        tables = [('users', User.__table__), ('room_types', RoomType.__table__), ('bookings', Booking.__table__),
+                  ('customers', Customer.__table__), ('booking_customers', booking_customers),
+                  ('booking_rooms', BookingRoom.__table__)]
+        for number in range(properties):
+            rows, generated_property = self.property_rows(number, room_types, bookings, max_nights, max_customers)
+            for name, table in tables:
+                for start in range(0, len(rows[name]), CHUNK_SIZE):
+                    session.execute(table.insert(), rows[name][start:start + CHUNK_SIZE])
+            session.commit()
+            generated.append(generated_property)
+        return generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--properties', type=int, default=1)
+    parser.add_argument('--room-types', type=int, default=5, help='room types per property')
+    parser.add_argument('--bookings', type=int, default=100, help='bookings per property')
+    parser.add_argument('--max-nights', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--namespace', help='salts generated keys (random by default)')
+    args = parser.parse_args()
+
+    session = sessionmaker(bind=database.get_engine(database.PRIMARY))()
+    generated = Generator(args.seed, args.namespace).load(session, args.properties, args.room_types,
+                                                          args.bookings, args.max_nights)
+    session.close()
+    print(json.dumps([{'id': item.id, 'password': item.password, 'room_types': len(item.room_type_ids),
+                       'bookings': len(item.booking_ids)} for item in generated]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Latency of a GetBookingList poll that finds nothing new.
+
+Seeds one property with a history of bookings in the database named by the DB_* environment
+variables (schema.sql already loaded, as for the tests), then repeatedly polls with the latest
+version and reports latency percentiles and statements per poll.
+
+    python -m benchmarks.empty_poll --bookings 5000 --iterations 500
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import database
+import index
+
+from controllers import DatabaseController
+from models import User, Booking
+
+SHARED_SECRET = 'benchmark-secret'
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=1000, help='bookings already seen by the poller')
+    parser.add_argument('--iterations', type=int, default=200, help='polls to time')
+    args = parser.parse_args()
+
+    os.environ['shared_secret'] = SHARED_SECRET
+    password = 'benchmarkpassword'
+    email = str(uuid.uuid4()) + '@benchmark.example.com'
+    event_body = {
+        'verb': 'GetBookingList',
+        'mya_property_id': 'BenchmarkMyaPropertyID',
+        'ota_property_id': email,
+        'ota_property_password': password
+    }
+
+    # Seeding through the controller's own engine
+    session = DatabaseController(dict(event_body, shared_secret=SHARED_SECRET)).Session()
+    session.add(User(id=email, password=password))
+    session.commit()
+    dttm = datetime.now() + timedelta(days=-365)
+    for count in range(args.bookings):
+        session.add(Booking(id=str(uuid.uuid4()), user_id=email, dttm=dttm + timedelta(minutes=count)))
+        if count % 1000 == 999:
+            session.commit()
+    session.commit()
+    version = str(session.query(User.booking_seq).filter(User.id == email).scalar())
+    session.close()
+
+    statements = []
+    event.listen(database.get_engine(database.REPLICA), 'before_cursor_execute',
+                 lambda conn, cursor, statement, parameters, context, executemany: statements.append(statement))
+
+    samples = []
+    for count in range(args.iterations):
+        started = time.perf_counter()
+        result = index.router(dict(event_body, shared_secret=SHARED_SECRET, ota_booking_version=version), None)
+        samples.append((time.perf_counter() - started) * 1000.0)
+        assert json.loads(result['body'])['Bookings'] == []
+
+    print(json.dumps({
+        'benchmark': 'empty_poll',
+        'bookings': args.bookings,
+        'iterations': args.iterations,
+        'statements_per_poll': len(statements) / float(args.iterations),
+        'p50_ms': round(percentile(samples, 0.50), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'mean_ms': round(sum(samples) / len(samples), 3)
+    }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Cost of rendering and encoding one large Booking, without a database.
+
+Compares the former float/strftime conversions followed by json.dumps with render_booking plus
+each available encoder backend.
+
+    python -m benchmarks.encode_booking --rooms 10 --nights 60
+"""
+import argparse
+import json
+import timeit
+
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import encoder
+
+from documents import render_booking
+
+FakeBooking = namedtuple('FakeBooking', ['cancellation', 'dttm', 'currency', 'customers'])
+FakeCustomer = namedtuple('FakeCustomer', ['country', 'email', 'first_name', 'last_name'])
+
+
+def legacy_document(order_id, booking, day_rates):
+    """The Booking as built before the encoder handled Decimal and dates itself."""
+    document = render_booking(order_id, booking, day_rates)
+    document['OrderDate'] = booking.dttm.strftime('%Y-%m-%d')
+    document['OrderTime'] = booking.dttm.strftime('%H:%M:%S')
+    for group in document['Rooms']:
+        group['EndDate'] = group['EndDate'].isoformat()
+        group['StartDate'] = group['StartDate'].isoformat()
+        group['Price'] = float(group['Price'])
+        for day_rate in group['DayRates']:
+            day_rate['Date'] = day_rate['Date'].isoformat()
+            day_rate['Rate'] = float(day_rate['Rate'])
+    document['TotalPrice'] = float(document['TotalPrice'])
+    return document
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=10, help='room groups in the booking')
+    parser.add_argument('--nights', type=int, default=60, help='nights per room group')
+    parser.add_argument('--number', type=int, default=200, help='encodings per timing')
+    args = parser.parse_args()
+
+    booking = FakeBooking(False, datetime(2018, 6, 1, 12, 30, 0), 'USD',
+                          [FakeCustomer('US', 'guest{0}@example.com'.format(count), 'John', 'Doe') for count in range(2)])
+    arrival = date(2018, 7, 1)
+    day_rates = []
+    for room in range(args.rooms):
+        # Two places, as DECIMAL(15,2) columns return them
+        rates = [(Decimal(100 + room) + Decimal(night % 100) / 100).quantize(Decimal('0.01'))
+                 for night in range(args.nights)]
+        for night, rate in enumerate(rates):
+            day_rates.append(('booking', 'room-{0:03d}'.format(room), arrival + timedelta(days=night), 'Night',
+                              rate, None, arrival, arrival + timedelta(days=args.nights - 1), sum(rates)))
+
+    candidates = [('legacy_float_json', lambda: json.dumps(legacy_document('booking', booking, day_rates)))]
+    for name, dumps in sorted(encoder.BACKENDS.items()):
+        candidates.append(('encoder_' + name, lambda dumps=dumps: dumps(render_booking('booking', booking, day_rates))))
+
+    for name, function in candidates:
+        best = min(timeit.repeat(function, number=args.number, repeat=5)) / args.number
+        print(json.dumps({'benchmark': 'encode_booking', 'candidate': name, 'day_rates': len(day_rates),
+                          'bytes': len(function()), 'us_per_booking': round(best * 1e6, 1)}))
+
+
+if __name__ == '__main__':
+    main()
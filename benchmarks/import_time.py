@@ -0,0 +1,84 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Cold-start import cost measured with python -X importtime.
+
+Each scenario runs in a fresh interpreter and reports the cumulative microseconds of every
+top-level import plus the number of modules loaded, taking the median over several runs.
+
+    python -m benchmarks.import_time --runs 9
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEALTH_CHECK = {'verb': 'HealthCheck', 'mya_property_id': '', 'ota_property_id': '', 'shared_secret': 'x'}
+
+SCENARIOS = {
+    # Importing the handler, as the Lambda runtime does during init
+    'import_index': 'import index',
+    # Handler plus a verb that needs no database
+    'health_check': 'import os; os.environ["shared_secret"] = "x"; import index; '
+                    'index.router({0!r}, None)'.format(HEALTH_CHECK),
+    # Handler plus resolving a database verb's controller
+    'database_verb': 'import index; index.registry.controller_for("GetBookingList")'
+}
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def measure(code):
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    total = 0
+    modules = 0
+    for line in process.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules = modules + 1
+            # Top level imports are indented by a single space
+            if len(match.group(3)) == 1:
+                total = total + int(match.group(2))
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per scenario')
+    args = parser.parse_args()
+
+    for name in sorted(SCENARIOS):
+        samples = sorted(measure(SCENARIOS[name]) for run in range(args.runs))
+        total, modules = samples[len(samples) // 2]
+        print(json.dumps({
+            'benchmark': 'import_time',
+            'scenario': name,
+            'runs': args.runs,
+            'cumulative_us': total,
+            'modules': modules
+        }))
+
+
+if __name__ == '__main__':
+    main()
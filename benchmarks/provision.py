@@ -0,0 +1,71 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Throughput of provision.py at several worker counts.
+
+Provisions the same number of generated properties (each with a few room types) once per worker
+count, in the database named by the DB_* environment variables (schema.sql already loaded, as for
+the tests), and reports properties per second. bcrypt dominates, so expect scaling up to the
+number of cores.
+
+    python -m benchmarks.provision --properties 200 --workers 1,2,4,8
+"""
+import argparse
+import json
+import time
+import uuid
+
+from sqlalchemy.orm import sessionmaker
+
+import database
+
+from provision import provision
+
+
+def properties(count, room_types):
+    run = uuid.uuid4().hex
+    for number in range(count):
+        property_id = '{0}-{1}@benchmark.example.com'.format(run, number)
+        yield {'id': property_id, 'password': 'benchmark-password-{0}'.format(number), 'myallocator_id': None,
+               'room_types': [{'id': str(uuid.uuid4()), 'user_id': property_id, 'title': 'Room {0}'.format(room),
+                               'detail': '', 'occupancy': 2, 'dorm': False} for room in range(room_types)]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--properties', type=int, default=200, help='properties provisioned per run')
+    parser.add_argument('--room-types', type=int, default=5, help='room types per property')
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts')
+    parser.add_argument('--chunk-size', type=int, default=100)
+    args = parser.parse_args()
+
+    session = sessionmaker(bind=database.get_engine(database.PRIMARY))()
+    for workers in [int(workers) for workers in args.workers.split(',')]:
+        started = time.perf_counter()
+        written, room_types = provision(session, properties(args.properties, args.room_types), workers,
+                                        args.chunk_size)
+        elapsed = time.perf_counter() - started
+        print(json.dumps({'benchmark': 'provision', 'workers': workers, 'properties': written,
+                          'room_types': room_types, 'seconds': round(elapsed, 3),
+                          'properties_per_second': round(written / elapsed, 1)}))
+    session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Latency and throughput of every verb through index.router at several data sizes.
+
+For each size (bookings per property) a fresh set of properties is generated with
+benchmarks.datagen in the database named by the DB_* environment variables (schema.sql already
+loaded, as for the tests). Each verb is then called against randomly chosen properties and
+bookings, after a few warm-up calls, and its p50/p99 latency, mean and throughput are recorded.
+Results are written as JSON together with the commit they were measured at; --compare reports
+the p50 change against an earlier results file and fails when any exceeds --tolerance.
+
+    python -m benchmarks.suite --sizes 100,1000,10000 --output results.json
+    python -m benchmarks.suite --sizes 100,1000,10000 --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from datetime import date, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+import database
+import index
+
+from benchmarks.datagen import Generator
+
+SHARED_SECRET = 'benchmark-secret'
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], universal_newlines=True,
+                                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def verb_events(rng):
+    """Builds the request of each verb for a randomly chosen property and booking."""
+
+    def base(verb, generated):
+        return {'verb': verb, 'mya_property_id': 'BenchmarkMyaPropertyID', 'ota_property_id': generated.id,
+                'ota_property_password': generated.password}
+
+    def get_room_types(generated):
+        return base('GetRoomTypes', generated)
+
+    def get_booking_list(generated):
+        # Sequences count up from 1 per property, so this polls for about the ten newest bookings
+        return dict(base('GetBookingList', generated),
+                    ota_booking_version=str(max(0, len(generated.booking_ids) - 10)))
+
+    def get_booking_id(generated):
+        return dict(base('GetBookingId', generated), booking_id=rng.choice(generated.booking_ids))
+
+    def get_booking_ids(generated):
+        return dict(base('GetBookingIds', generated),
+                    booking_ids=rng.sample(generated.booking_ids, min(20, len(generated.booking_ids))))
+
+    def ari_update(generated):
+        start_date = date(2018, 7, 1) + timedelta(days=rng.randint(0, 300))
+        return dict(base('ARIUpdate', generated), Inventory=[
+            {'ota_room_id': room_type_id, 'start_date': (start_date + timedelta(days=day)).isoformat(),
+             'end_date': (start_date + timedelta(days=day)).isoformat(), 'units': rng.randint(0, 10),
+             'price': '{0}.00'.format(rng.randint(50, 300))}
+            for room_type_id in generated.room_type_ids for day in range(30)])
+
+    return [('GetRoomTypes', get_room_types), ('GetBookingList', get_booking_list),
+            ('GetBookingId', get_booking_id), ('GetBookingIds', get_booking_ids), ('ARIUpdate', ari_update)]
+
+
+def measure(verb, build_event, properties, rng, iterations, warmup):
+    samples = []
+    started = time.perf_counter()
+    for count in range(warmup + iterations):
+        event = dict(build_event(rng.choice(properties)), shared_secret=SHARED_SECRET)
+        call_started = time.perf_counter()
+        result = index.router(event, None)
+        elapsed = (time.perf_counter() - call_started) * 1000.0
+        if not json.loads(result['body'])['success']:
+            raise RuntimeError('{0} failed: {1}'.format(verb, result['body']))
+        if count == warmup - 1:
+            started = time.perf_counter()
+        if count >= warmup:
+            samples.append(elapsed)
+    wall = time.perf_counter() - started
+    return {
+        'verb': verb,
+        'iterations': iterations,
+        'p50_ms': round(percentile(samples, 0.50), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'throughput_rps': round(iterations / wall, 1),
+        'statements': database.statement_counts(verb)['last']
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Prints the p50 change of each (size, verb) also in the baseline; returns the regressions."""
+    previous = dict(((entry['bookings'], entry['verb']), entry) for entry in baseline['results'])
+    regressions = []
+    for entry in results['results']:
+        before = previous.get((entry['bookings'], entry['verb']))
+        if before is None:
+            continue
+        change = (entry['p50_ms'] - before['p50_ms']) / before['p50_ms'] if before['p50_ms'] else 0.0
+        print('{0:>8} {1:<16} p50 {2:>9.3f} -> {3:>9.3f} ms ({4:+.1%})'.format(
+            entry['bookings'], entry['verb'], before['p50_ms'], entry['p50_ms'], change), file=sys.stderr)
+        if change > tolerance:
+            regressions.append((entry['bookings'], entry['verb'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000', help='comma separated bookings per property')
+    parser.add_argument('--properties', type=int, default=5, help='properties generated per size')
+    parser.add_argument('--room-types', type=int, default=10, help='room types per property')
+    parser.add_argument('--iterations', type=int, default=200, help='timed calls per verb and size')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed calls per verb and size')
+    parser.add_argument('--verbs', help='comma separated subset of verbs to run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results JSON here instead of stdout')
+    parser.add_argument('--compare', help='earlier results JSON to compare p50 latencies with')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='p50 slowdown reported as a regression')
+    args = parser.parse_args()
+
+    os.environ['shared_secret'] = SHARED_SECRET
+    session = sessionmaker(bind=database.get_engine(database.PRIMARY))()
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'database': database.get_engine(database.PRIMARY).dialect.name,
+        'seed': args.seed,
+        'properties': args.properties,
+        'room_types': args.room_types,
+        'results': []
+    }
+    for size in [int(size) for size in args.sizes.split(',')]:
+        generator = Generator(args.seed, namespace='{0}-{1}-{2}'.format(args.seed, size, time.time()))
+        properties = generator.load(session, args.properties, args.room_types, size)
+        rng = random.Random(args.seed)
+        for verb, build_event in verb_events(rng):
+            if args.verbs and verb not in args.verbs.split(','):
+                continue
+            entry = measure(verb, build_event, properties, rng, args.iterations, args.warmup)
+            entry['bookings'] = size
+            results['results'].append(entry)
+            print(json.dumps(entry), file=sys.stderr)
+    session.close()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        if regressions:
+            raise SystemExit('{0} p50 regressions over {1:.0%}'.format(len(regressions), args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+
+from collections import OrderedDict
+
+
+class CredentialCache(object):
+    """
+    Per-container cache of property passwords that have already passed bcrypt.
+
+    Entries are keyed by property id and hold an HMAC of the supplied password (keyed with a random
+    per-container secret, so plain text never sits in memory), the stored bcrypt hash it was verified
+    against and an expiry. A changed stored hash, an expired entry or a different password all fall
+    back to bcrypt.
+    """
+
+    def __init__(self, ttl=300, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+
+    def _digest(self, password):
+        return hmac.new(self._key, password.encode('utf-8'), hashlib.sha256).digest()
+
+    def is_verified(self, property_id, password, stored_hash):
+        entry = self._entries.get(property_id)
+        if entry is not None:
+            digest, entry_hash, expires = entry
+            if expires <= time.monotonic() or entry_hash != stored_hash:
+                del self._entries[property_id]
+            elif hmac.compare_digest(digest, self._digest(password)):
+                self._entries.move_to_end(property_id)
+                self.hits = self.hits + 1
+                return True
+        self.misses = self.misses + 1
+        return False
+
+    def add(self, property_id, password, stored_hash):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        self._entries[property_id] = (self._digest(password), stored_hash, time.monotonic() + self.ttl)
+        self._entries.move_to_end(property_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, property_id=None):
+        if property_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(property_id, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+credential_cache = CredentialCache(ttl=int(os.environ.get('AUTH_CACHE_TTL', 300)),
+                                   max_size=int(os.environ.get('AUTH_CACHE_SIZE', 1024)))
+
+
+class MemoryTier(object):
+    """
+    Shared tier interface: get() returns the text stored under a key or None, set() stores it.
+    This stand-in only shares within the process; FileTier shares between processes on one host.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def set(self, key, value):
+        self._values[key] = value
+
+
+class FileTier(object):
+    """Shared tier keeping one file per key in a directory, replaced atomically on every set()."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as stored:
+                return stored.read()
+        except (IOError, OSError):
+            return None
+
+    def set(self, key, value):
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(descriptor, 'w') as stored:
+            stored.write(value)
+        os.replace(temporary, self._path(key))
+
+
+SHARED_TIERS = {'memory': lambda argument: MemoryTier(), 'file': FileTier}
+
+
+def shared_tier(spec):
+    """Builds the shared tier named by a 'kind' or 'kind:argument' spec, e.g. file:/tmp/room-types."""
+    if not spec:
+        return None
+    kind, _, argument = spec.partition(':')
+    return SHARED_TIERS[kind](argument)
+
+
+class RoomTypeCache(object):
+    """
+    GetRoomTypes responses by property id, tagged with the property's users.room_type_version.
+
+    The in-process LRU is checked first, then the optional shared tier, which stores each catalogue
+    as JSON. An entry is only returned for the version it was stored with; the room_types triggers
+    bump the version on every write, so a changed catalogue always misses.
+    """
+
+    def __init__(self, max_size=1024, shared=None):
+        self.max_size = max_size
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _key(property_id):
+        return 'room_types/' + property_id
+
+    def get(self, property_id, version):
+        entry = self._entries.get(property_id)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(property_id)
+            self.hits = self.hits + 1
+            return entry[1]
+        if self.shared is not None:
+            stored = self.shared.get(self._key(property_id))
+            if stored is not None:
+                stored = json.loads(stored)
+                if stored['version'] == version:
+                    self._remember(property_id, version, stored['rooms'])
+                    self.shared_hits = self.shared_hits + 1
+                    return stored['rooms']
+        self.misses = self.misses + 1
+        return None
+
+    def add(self, property_id, version, rooms):
+        self._remember(property_id, version, rooms)
+        if self.shared is not None:
+            self.shared.set(self._key(property_id), json.dumps({'version': version, 'rooms': rooms}))
+
+    def _remember(self, property_id, version, rooms):
+        if self.max_size <= 0:
+            return
+        self._entries[property_id] = (version, rooms)
+        self._entries.move_to_end(property_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, property_id=None):
+        if property_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(property_id, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'shared_hits': self.shared_hits, 'misses': self.misses,
+                'size': len(self._entries)}
+
+
+room_type_cache = RoomTypeCache(max_size=int(os.environ.get('ROOM_TYPE_CACHE_SIZE', 1024)),
+                                shared=shared_tier(os.environ.get('ROOM_TYPE_CACHE_SHARED')))
@@ -16,6 +16,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import base64
 import json
 import logging
 import os
@@ -23,12 +24,23 @@ import traceback
 
 from datetime import datetime, timedelta
 from decimal import *
+from itertools import groupby
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, joinedload
 from sqlalchemy.exc import SQLAlchemyError, DBAPIError
 
+import database
+import deadline
+import documents
+import metrics
+
+from base import BaseController, MA_OTA_PARAM_VERB
+from deadline import DeadlineExceeded
+from cache import credential_cache, room_type_cache
+from documents import day_rates_query, load_booking, render_booking
+from encoder import RawJSON, dumps
 from models import User, RoomType, Booking
+from registry import register
 
 logger = logging.getLogger(__name__)
 
@@ -37,128 +49,67 @@ if 'logging_level' in os.environ:
 else:
     logger.setLevel('INFO')
 
-MA_OTA_PARAM_VERB = 'verb'
-
-
-class BaseController(object):
-
-    MA_OTA_PARAM_MYA_PROPERTY_ID = 'mya_property_id'
-    MA_OTA_PARAM_OTA_PROPERTY_ID = 'ota_property_id'
-    MA_OTA_PARAM_SHARED_SECRET = 'shared_secret'
-
-    MA_OTA_SUCCESS = 'success'
-    MA_OTA_TYPE = 'type'
-    MA_OTA_MSG = 'msg'
-
-    def __init__(self, body):
-
-        self.body = body
-        self._errors = []
-        self._data = {}
-        self._required_params = [
-            MA_OTA_PARAM_VERB,
-            self.MA_OTA_PARAM_MYA_PROPERTY_ID,
-            self.MA_OTA_PARAM_OTA_PROPERTY_ID
-        ]
-
-        # Securely removing the shared secret
-        shared_secret = self.body.pop(self.MA_OTA_PARAM_SHARED_SECRET, None)
-
-        # Validate the shared secret.
-        if shared_secret != os.environ[self.MA_OTA_PARAM_SHARED_SECRET]:
-            self._errors.append({
-                self.MA_OTA_TYPE: 'api',
-                self.MA_OTA_MSG: 'Invalid or missing authentication arguments'
-            })
-
-        # Logging the payload before handlers.
-        if logger.getEffectiveLevel() == logging.DEBUG:
-            logger.debug(json.dumps(self.body))
-
-    def __enter__(self):
-        pass
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        pass
-
-    def validate(self):
-        for param in self._required_params:
-            if param not in self.body:
-                self._errors.append({
-                    self.MA_OTA_TYPE: 'api',
-                    self.MA_OTA_MSG: 'Invalid or missing Api arguments'
-                })
-                logger.error('Request missing a parameter: {0}'.format(param))
-                return False
-        return True
-
-    def is_error(self):
-        return len(self._errors) > 0
-
-    def add_error(self, error_msg):
-        self._data[self.MA_OTA_SUCCESS] = False
-        self._errors.append({
-            self.MA_OTA_TYPE: 'api',
-            self.MA_OTA_MSG: error_msg
-        })
-
-    def add_required(self, param):
-        self._required_params.append(param)
-
-    def perform_action(self):
-        pass
-
-    def handle(self):
-
-        with self:
-            try:
-                self.validate()
-                if not self.is_error():
-                    self.perform_action()
-            except Exception as e:
-                self.add_error('Generic error')
-                logger.error(traceback.format_exc())
-
-        # Adding the errors to the array
-        if self.is_error():
-            self._data[self.MA_OTA_SUCCESS] = False
-            self._data['errors'] = self._errors
-        else:
-            self._data[self.MA_OTA_SUCCESS] = True
-
-        # Logging the return payload
-        if logger.getEffectiveLevel() == logging.DEBUG:
-            logger.debug('Response is: ' + json.dumps(self._data))
-
-        return json.dumps(self._data)
-
 
 class DatabaseController(BaseController):
 
-    mysql = None
+    # Controllers that never write run on the replica's autocommit connections, skipping COMMIT
+    # and ROLLBACK; everything else runs in a READ COMMITTED transaction on the primary
+    read_only = False
 
     def __init__(self, body):
         super(DatabaseController, self).__init__(body)
-        if DatabaseController.mysql is None:
-            DatabaseController.mysql = create_engine('mysql+mysqlconnector://' + os.environ['DB_USER'] + ':' +
-                              os.environ['DB_PASS'] + '@' + os.environ['DB_HOST'] + '/' +
-                              os.environ['DB_NAME'],
-                              echo=(True if 'logging_level' in os.environ and os.environ['logging_level'] == 'DEBUG'
-                                    else False),
-                              isolation_level='READ COMMITTED', pool_pre_ping=True)
-        self.Session = sessionmaker(bind=DatabaseController.mysql)
+        self.Session = sessionmaker(bind=database.get_engine(database.PRIMARY))
+        self.outer_session = None
+        self.savepoint = None
+
+    def attach(self, session):
+        """
+        Runs the controller in a session owned by another (a Batch), which commits it. Writes get a
+        savepoint of their own, rolled back if the controller fails.
+        """
+        self.outer_session = session
 
     def __enter__(self):
         super(DatabaseController, self).__enter__()
-        self.session = self.Session()
+        if self.outer_session is not None:
+            self.session = self.outer_session
+            if not self.read_only:
+                self.savepoint = self.session.begin_nested()
+            return
+        database.begin_trace(self.body.get(MA_OTA_PARAM_VERB))
+        if self.read_only:
+            try:
+                self.connection = database.connect_read_only()
+            except DBAPIError as e:
+                self.connection = None
+                self.add_error('Generic database error')
+                logger.error('MySQL error({0})'.format(e.orig))
+            self.session = self.Session(bind=self.connection, autocommit=True)
+        else:
+            self.session = self.Session()
 
     def __exit__(self, exc_type, exc_value, traceback):
         super(DatabaseController, self).__exit__(exc_type, exc_value, traceback)
-        if self.is_error():
-            self.session.rollback()
+        if self.outer_session is not None:
+            if self.savepoint is not None:
+                self.release_savepoint()
+            return
+        if self.read_only:
+            self.session.close()
+            if self.connection is not None:
+                self.connection.close()
+        elif self.is_error():
+            with metrics.timed('rollback'):
+                self.session.rollback()
         else:
             try:
-                self.session.commit()
+                with metrics.timed('commit'):
+                    self.session.commit()
+            except DeadlineExceeded as e:
+                # The flush, or rendering the booking documents, ran out of time
+                self.add_error('Request timed out')
+                logger.warning('Deadline exceeded: {0}'.format(e))
+                self.session.rollback()
             except DBAPIError as e:
                 self.add_error('Generic database error')
                 logger.error('MySQL error({0})'.format(e.orig))
@@ -166,21 +117,65 @@ class DatabaseController(BaseController):
                 self.add_error('Application specific database error')
                 logger.error('SQLAlchemy error({0})'.format(e.code))
 
+        # Logging the primary/replica split and the statements this request ran
+        trace = database.end_trace()
+        if logger.getEffectiveLevel() == logging.DEBUG:
+            logger.debug('Database engines: ' + json.dumps(database.engine_stats()))
+            logger.debug('Statements: ' + json.dumps(trace.summary()))
+
+    def release_savepoint(self):
+        try:
+            if self.is_error():
+                self.savepoint.rollback()
+            else:
+                self.savepoint.commit()
+        except DeadlineExceeded as e:
+            # Undoing the savepoint would take another statement, so the owner times out as well and
+            # rolls back its whole transaction
+            self.add_error('Request timed out')
+            logger.warning('Deadline exceeded: {0}'.format(e))
+            raise
+        except DBAPIError as e:
+            self.add_error('Generic database error')
+            logger.error('MySQL error({0})'.format(e.orig))
+        except SQLAlchemyError as e:
+            self.add_error('Application specific database error')
+            logger.error('SQLAlchemy error({0})'.format(e.code))
+
 
 class AuthenticatedDatabaseController(DatabaseController):
 
     def __init__(self, body):
         super(AuthenticatedDatabaseController, self).__init__(body)
+        self.user = None
         if not self.is_error():
             self.add_required('ota_property_password')
 
+    def attach(self, session, user=None):
+        """As DatabaseController.attach, also taking the property the owner already authenticated."""
+        super(AuthenticatedDatabaseController, self).attach(session)
+        self.user = user
+
     def perform_action(self):
         super(AuthenticatedDatabaseController, self).perform_action()
-        for user in self.session.query(User).filter(User.id == self.body['ota_property_id']):
-            if not user.validate_pw(self.body['ota_property_password']):
-                self.add_error('Invalid or missing authentication arguments')
-
-
+        if self.outer_session is not None and self.user is not None:
+            return
+        password = self.body['ota_property_password']
+        with metrics.timed('auth'):
+            for user in self.session.query(User).filter(User.id == self.body['ota_property_id']):
+                self.user = user
+                # Warm containers skip bcrypt for credentials already verified against this stored hash
+                if credential_cache.is_verified(user.id, password, user.password):
+                    continue
+                with metrics.timed('bcrypt'):
+                    verified = user.validate_pw(password)
+                if verified:
+                    credential_cache.add(user.id, password, user.password)
+                else:
+                    self.add_error('Invalid or missing authentication arguments')
+
+
+@register('SetupProperty')
 class SetupPropertyDatabaseController(AuthenticatedDatabaseController):
 
     def perform_action(self):
@@ -191,49 +186,113 @@ class SetupPropertyDatabaseController(AuthenticatedDatabaseController):
                 self._data['ota_property_id'] = user.id
 
 
+@register('GetRoomTypes')
 class GetRoomTypesDatabaseController(AuthenticatedDatabaseController):
 
+    read_only = True
+
     def perform_action(self):
         super(GetRoomTypesDatabaseController, self).perform_action()
         if not self.is_error():
-            self._data['Rooms'] = []
-            for room_type in self.session.query(RoomType).join(RoomType.user).\
-                    filter(User.id == self.body['ota_property_id']):
-                self._data['Rooms'].append({
-                    'ota_room_id': room_type.id,
-                    'title': room_type.title,
-                    'detail': room_type.detail,
-                    'occupancy': room_type.occupancy,
-                    'dorm': room_type.dorm
-                })
+            # The version is read (with the user) before the room types, so a concurrent write can
+            # only leave a newer catalogue under an older version, never the reverse
+            cached = self.user is not None
+            rooms = room_type_cache.get(self.user.id, self.user.room_type_version) if cached else None
+            if rooms is None:
+                rooms = []
+                for room_type in self.session.query(RoomType).join(RoomType.user).\
+                        filter(User.id == self.body['ota_property_id']):
+                    rooms.append({
+                        'ota_room_id': room_type.id,
+                        'title': room_type.title,
+                        'detail': room_type.detail,
+                        'occupancy': room_type.occupancy,
+                        'dorm': room_type.dorm
+                    })
+                if cached:
+                    room_type_cache.add(self.user.id, self.user.room_type_version, rooms)
+            self._data['Rooms'] = rooms
 
 
+@register('GetBookingList')
 class GetBookingListController(AuthenticatedDatabaseController):
 
+    MA_OTA_PARAM_BOOKING_CURSOR = 'ota_booking_cursor'
+
+    read_only = True
+
+    page_size = int(os.environ.get('BOOKING_LIST_PAGE_SIZE', 500))
+    fetch_size = 100
+
     def __init__(self, body):
         super(GetBookingListController, self).__init__(body)
         if not self.is_error():
             self.add_required('ota_booking_version')
 
+    @staticmethod
+    def encode_cursor(seq):
+        return base64.urlsafe_b64encode(json.dumps([seq]).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        seq, = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return int(seq)
+
     def perform_action(self):
         super(GetBookingListController, self).perform_action()
         if not self.is_error():
-            booking_query = self.session.query(Booking).filter(Booking.guid.is_(None)).\
-                join(Booking.user).filter(User.id == self.body['ota_property_id'])
-            requested_datetime = None if 'ota_booking_version' not in self.body \
-                or self.body['ota_booking_version'] is None else \
-                datetime.strptime(self.body['ota_booking_version'], '%Y-%m-%d %H:%M:%S')
-            if requested_datetime is not None:
-                query_datetime = requested_datetime + timedelta(minutes=-5)
+            booking_query = self.session.query(Booking.id, Booking.seq).filter(Booking.guid.is_(None)).\
+                filter(Booking.user_id == self.body['ota_property_id'])
+
+            # Versions are the property's booking change sequence. Timestamps are still accepted from
+            # pollers that last saw a version handed out before the sequence existed.
+            version = self.body.get('ota_booking_version')
+            cursor = self.body.get(self.MA_OTA_PARAM_BOOKING_CURSOR)
+            if version is not None and str(version).isdigit():
+                # The property row read during authentication carries its high-water mark
+                if cursor is None and self.user is not None and self.user.booking_seq <= int(version):
+                    self._data['Bookings'] = []
+                    return
+                booking_query = booking_query.filter(Booking.seq > int(version))
+            elif version is not None:
+                query_datetime = datetime.strptime(version, '%Y-%m-%d %H:%M:%S') + timedelta(minutes=-5)
                 booking_query = booking_query.filter(Booking.dttm >= query_datetime)
+
+            # Resuming after the last sequence handed out on the previous page
+            if cursor is not None:
+                try:
+                    booking_query = booking_query.filter(Booking.seq > self.decode_cursor(cursor))
+                except (TypeError, ValueError):
+                    self.add_error('Invalid booking cursor')
+                    return
+
+            # One row past the page tells us whether a continuation is needed. Rows are handled
+            # fetch_size at a time; a deadline reached before the next fetch returns the bookings
+            # read so far, with a cursor to resume from.
+            booking_query = booking_query.order_by(Booking.seq).\
+                limit(self.page_size + 1).yield_per(self.fetch_size)
             self._data['Bookings'] = []
-            for booking in booking_query:
-                self._data['Bookings'].append({
-                    'booking_id': booking.id,
-                    'version': booking.dttm.strftime('%Y-%m-%d %H:%M:%S')
-                })
+            last_seq = None
+            try:
+                for booking_id, seq in booking_query:
+                    if len(self._data['Bookings']) == self.page_size:
+                        self._data[self.MA_OTA_PARAM_BOOKING_CURSOR] = self.encode_cursor(last_seq)
+                        continue
+                    self._data['Bookings'].append({
+                        'booking_id': booking_id,
+                        'version': str(seq)
+                    })
+                    last_seq = seq
+                    if len(self._data['Bookings']) % self.fetch_size == 0:
+                        deadline.check('fetch more bookings')
+            except DeadlineExceeded:
+                if not self._data['Bookings']:
+                    raise
+                logger.warning('Deadline reached, returning {0} bookings'.format(len(self._data['Bookings'])))
+                self._data[self.MA_OTA_PARAM_BOOKING_CURSOR] = self.encode_cursor(last_seq)
 
 
+@register('GetBookingId')
 class GetBookingIdController(AuthenticatedDatabaseController):
 
     def __init__(self, body):
@@ -241,69 +300,127 @@ class GetBookingIdController(AuthenticatedDatabaseController):
         if not self.is_error():
             self.add_required('booking_id')
 
+    @property
+    def read_only(self):
+        # Acknowledging a booking with its MyAllocator guid is the only write
+        return 'guid' not in self.body
+
     def perform_action(self):
         super(GetBookingIdController, self).perform_action()
         if not self.is_error():
-            booking = self.session.query(Booking).get(self.body['booking_id'])
+            self._data['ota_property_id'] = self.body['ota_property_id']
+            self._data['mya_property_id'] = self.body['mya_property_id']
+            self._data['booking_id'] = self.body['booking_id']
+
+            # A current materialized document is served as is
+            if documents.enabled():
+                document = documents.load(self.session, [self.body['booking_id']]).get(self.body['booking_id'])
+                if document is None and self.read_only:
+                    document = documents.materialize_on_primary(self.session, [self.body['booking_id']]).\
+                        get(self.body['booking_id'])
+                if document is not None:
+                    if 'guid' in self.body:
+                        self.session.query(Booking).filter(Booking.id == self.body['booking_id']).\
+                            update({Booking.guid: self.body['guid']}, synchronize_session=False)
+                    self._data['Booking'] = RawJSON(document)
+                    return
+
+            # Booking, customers and aggregated day rates in a single round trip
+            booking, day_rates = load_booking(self.session, self.body['booking_id'])
             if 'guid' in self.body:
                 booking.guid = self.body['guid']
+            self._data['Booking'] = render_booking(self.body['booking_id'], booking, day_rates)
+            if documents.enabled() and not self.read_only:
+                documents.store(self.session, {booking.id: (booking.seq, dumps(self._data['Booking']))})
+
+
+@register('GetBookingIds')
+class GetBookingIdsController(AuthenticatedDatabaseController):
+    """
+    Batched GetBookingId: authenticates once and loads every requested booking of the property with
+    set-based queries. Each entry of Bookings carries its own success flag and errors.
+    """
+
+    max_batch_size = int(os.environ.get('BOOKING_BATCH_SIZE', 100))
+
+    def __init__(self, body):
+        super(GetBookingIdsController, self).__init__(body)
+        if not self.is_error():
+            self.add_required('booking_ids')
+
+    @property
+    def read_only(self):
+        # Optional {booking_id: guid} acknowledgements are the only writes
+        return not self.body.get('guids')
+
+    def validate(self):
+        if not super(GetBookingIdsController, self).validate():
+            return False
+        booking_ids = self.body['booking_ids']
+        if not isinstance(booking_ids, list) or len(booking_ids) > self.max_batch_size or \
+                not isinstance(self.body.get('guids', {}), dict):
+            self.add_error('Invalid or missing Api arguments')
+            logger.error('Invalid booking_ids or guids in batch request')
+            return False
+        return True
+
+    def perform_action(self):
+        super(GetBookingIdsController, self).perform_action()
+        if not self.is_error():
+            booking_ids = self.body['booking_ids']
+            guids = self.body.get('guids') or {}
+
+            # Current materialized documents first, then the remaining bookings with their customers
+            # and every day rate, each in one round trip
+            stored = {}
+            if documents.enabled() and booking_ids:
+                stored = documents.load(self.session, booking_ids, user_id=self.body['ota_property_id'])
+                if self.read_only and len(stored) < len(set(booking_ids)):
+                    stored.update(documents.materialize_on_primary(
+                        self.session, [booking_id for booking_id in booking_ids if booking_id not in stored],
+                        user_id=self.body['ota_property_id']))
+                for booking_id in stored:
+                    if booking_id in guids:
+                        self.session.query(Booking).filter(Booking.id == booking_id).\
+                            update({Booking.guid: guids[booking_id]}, synchronize_session=False)
+            bookings = {}
+            missing = [booking_id for booking_id in booking_ids if booking_id not in stored]
+            if missing:
+                for booking in self.session.query(Booking).options(joinedload(Booking.customers)).\
+                        filter(Booking.id.in_(missing)).\
+                        filter(Booking.user_id == self.body['ota_property_id']):
+                    bookings[booking.id] = booking
+            day_rates = {}
+            if bookings:
+                for booking_id, rows in groupby(day_rates_query(self.session, list(bookings.keys())),
+                                                key=lambda row: row[0]):
+                    day_rates[booking_id] = list(rows)
+
             self._data['ota_property_id'] = self.body['ota_property_id']
             self._data['mya_property_id'] = self.body['mya_property_id']
-            self._data['booking_id'] = self.body['booking_id']
-            self._data['Booking'] = {
-                'OrderId': self.body['booking_id'],
-                'IsCancellation': booking.cancellation,
-                'OrderDate': booking.dttm.strftime('%Y-%m-%d'),
-                'OrderTime': booking.dttm.strftime('%H:%M:%S'),
-                'TotalCurrency': booking.currency,
-                'Customers': [],
-                'Rooms': []
-            }
-
-            # Adding customers from the booking
-            for customer in booking.customers:
-                self._data['Booking']['Customers'].append({
-                    'CustomerCountry': customer.country,
-                    'CustomerEmail': customer.email,
-                    'CustomerFName': customer.first_name,
-                    'CustomerLName': customer.last_name
-                })
-
-            # Grouping the booked rooms by type_id
-            room_groups = {}
-            for booked_room in booking.booked_rooms:
-                if booked_room.room_type_id not in room_groups:
-                    room_groups[booked_room.room_type_id] = []
-                room_groups[booked_room.room_type_id].append(booked_room)
-
-            # Creating the individual room groups
-            total_price = Decimal(0.0)
-            for room_group_key in room_groups.keys():
-                group_dict = {
-                    'ChannelRoomType': room_group_key,
-                    'Currency': booking.currency,
-                    'DayRates': []
-                }
-                start_date = None
-                end_date = None
-                group_price = Decimal(0.0)
-                for day_rate in room_groups[room_group_key]:
-                    if start_date is None or start_date > day_rate.dt:
-                        start_date = day_rate.dt
-                    if end_date is None or end_date < day_rate.dt:
-                        end_date = day_rate.dt
-                    group_price = group_price + day_rate.rate
-                    group_dict['DayRates'].append({
-                        'Date': day_rate.dt.strftime('%Y-%m-%d'),
-                        'Description': day_rate.description,
-                        'Rate': float(day_rate.rate),
-                        'Currency': booking.currency,
-                        'RateId': day_rate.rate_id
-                    })
-                group_dict['EndDate'] = end_date.strftime('%Y-%m-%d')
-                group_dict['StartDate'] = start_date.strftime('%Y-%m-%d')
-                group_dict['Price'] = float(group_price)
-                group_dict['Units'] = 1
-                self._data['Booking']['Rooms'].append(group_dict)
-                total_price = total_price + group_price
-            self._data['Booking']['TotalPrice'] = float(total_price)
+            self._data['Bookings'] = []
+            rendered = {}
+            for booking_id in booking_ids:
+                entry = {'booking_id': booking_id}
+                booking = bookings.get(booking_id)
+                if booking_id in stored:
+                    entry['Booking'] = RawJSON(stored[booking_id])
+                    entry[self.MA_OTA_SUCCESS] = True
+                elif booking is None:
+                    entry[self.MA_OTA_SUCCESS] = False
+                    entry['errors'] = [{self.MA_OTA_TYPE: 'api', self.MA_OTA_MSG: 'Unknown booking'}]
+                else:
+                    try:
+                        if booking_id in guids:
+                            booking.guid = guids[booking_id]
+                        entry['Booking'] = render_booking(booking_id, booking, day_rates.get(booking.id, []))
+                        entry[self.MA_OTA_SUCCESS] = True
+                        rendered[booking.id] = (booking.seq, dumps(entry['Booking']))
+                    except Exception:
+                        logger.error(traceback.format_exc())
+                        entry.pop('Booking', None)
+                        entry[self.MA_OTA_SUCCESS] = False
+                        entry['errors'] = [{self.MA_OTA_TYPE: 'api', self.MA_OTA_MSG: 'Generic error'}]
+                self._data['Bookings'].append(entry)
+            if documents.enabled() and not self.read_only:
+                documents.store(self.session, rendered)
@@ -0,0 +1,384 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import logging
+import math
+import os
+import socket
+import time
+
+from collections import OrderedDict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.pool import StaticPool
+
+import deadline
+import metrics
+
+from deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+if 'logging_level' in os.environ:
+    logger.setLevel(os.environ['logging_level'])
+else:
+    logger.setLevel('INFO')
+
+# The primary takes writes and anything that must read its own writes. Read-only verbs use the
+# replica engine, an autocommit pool pointed at DB_REPLICA_HOST; when no replica is configured
+# the replica role is the primary engine itself, checked out in autocommit.
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+# 'queue' is SQLAlchemy's default pool with a ping on every checkout. 'lambda' keeps a single
+# connection per engine (a container serves one request at a time), trusts it while recently
+# used, pings it after DB_POOL_PING_AFTER idle seconds and replaces it without a ping after
+# DB_POOL_RECYCLE_AFTER, which should sit below the server's (or proxy's) idle timeout.
+POOL_MODE_QUEUE = 'queue'
+POOL_MODE_LAMBDA = 'lambda'
+
+# Statements taking at least SLOW_QUERY_MS are logged with their parameters redacted
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+SLOWEST_KEPT = 3
+
+# MySQL's "maximum statement execution time exceeded", the error of a SELECT stopped by its hint
+ER_QUERY_TIMEOUT = 3024
+# The client's "lost connection" error, raised by mysql-connector-python-rf when its socket times out
+CR_SERVER_LOST_EXTENDED = 2055
+
+_engines = {}
+_stats = {}
+_verb_statements = {}
+_trace = None
+
+
+class StatementTrace(object):
+    """Statements executed on behalf of one request: how many, their total time and the slowest."""
+
+    def __init__(self, verb):
+        self.verb = verb
+        self.statements = 0
+        self.elapsed = 0.0
+        self.slowest = []
+
+    def add(self, statement, elapsed):
+        self.statements = self.statements + 1
+        self.elapsed = self.elapsed + elapsed
+        if len(self.slowest) < SLOWEST_KEPT or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, statement))
+            self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+
+    def summary(self):
+        return {
+            'verb': self.verb,
+            'statements': self.statements,
+            'elapsed_ms': round(self.elapsed, 3),
+            'slowest': [{'elapsed_ms': round(elapsed, 3), 'statement': statement}
+                        for elapsed, statement in self.slowest]
+        }
+
+
+def database_host(role=PRIMARY):
+    if role == REPLICA and os.environ.get('DB_REPLICA_HOST'):
+        return os.environ['DB_REPLICA_HOST']
+    return os.environ['DB_HOST']
+
+
+def database_url(role=PRIMARY):
+    # DB_URL (and DB_REPLICA_URL) replace the MySQL settings, e.g. sqlite:// for a local stand-in
+    if role == REPLICA and os.environ.get('DB_REPLICA_URL'):
+        return os.environ['DB_REPLICA_URL']
+    if os.environ.get('DB_URL'):
+        return os.environ['DB_URL']
+    return 'mysql+mysqlconnector://' + os.environ['DB_USER'] + ':' + os.environ['DB_PASS'] + '@' + \
+           database_host(role) + '/' + os.environ['DB_NAME']
+
+
+def has_replica():
+    return bool(os.environ.get('DB_REPLICA_URL') or os.environ.get('DB_REPLICA_HOST'))
+
+
+def pool_mode():
+    return os.environ.get('DB_POOL_MODE', POOL_MODE_QUEUE)
+
+
+def get_engine(role=PRIMARY):
+    engine = _engines.get(role)
+    if engine is None and role == REPLICA and not has_replica():
+        # Without a replica, read-only verbs share the primary's pool (one connection per container
+        # in lambda mode) and connect_read_only() switches their checkout to autocommit
+        engine = get_engine(PRIMARY)
+        _engines[role] = engine
+        _stats[role] = _stats[PRIMARY]
+        return engine
+    if engine is None and make_url(database_url(role)).get_backend_name() == 'sqlite':
+        engine = get_sqlite_engine(role)
+    if engine is None:
+        if role == PRIMARY:
+            options = {'isolation_level': 'READ COMMITTED'}
+        else:
+            options = {'isolation_level': 'AUTOCOMMIT', 'pool_reset_on_return': None}
+        if pool_mode() == POOL_MODE_LAMBDA:
+            options.update({'pool_size': 1, 'max_overflow': 0, 'pool_pre_ping': False})
+        else:
+            options.update({'pool_pre_ping': True})
+        engine = create_engine(database_url(role),
+                               echo=os.environ.get('SQL_ECHO', 'false').lower() == 'true',
+                               **options)
+        set_engine(role, engine)
+        limit_statements(engine)
+        if pool_mode() == POOL_MODE_LAMBDA:
+            validate_idle_connections(engine, _stats[role],
+                                      float(os.environ.get('DB_POOL_PING_AFTER', 30)),
+                                      float(os.environ.get('DB_POOL_RECYCLE_AFTER', 3600)))
+    return engine
+
+
+def connect_read_only():
+    """A connection for read-only verbs, which run without a transaction."""
+    engine = get_engine(REPLICA)
+    connection = engine.connect()
+    # The replica engine is autocommit throughout; SQLite has no autocommit level to switch to
+    if engine is get_engine(PRIMARY) and engine.dialect.name != 'sqlite':
+        connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+    return connection
+
+
+def get_sqlite_engine(role):
+    """
+    SQLite stand-in for tests, benchmarks and profiling. The schema, including the triggers models.py
+    declares for SQLite, is created on first use. A private in-memory database lives on a single
+    shared connection, which the replica role reuses.
+    """
+    url = make_url(database_url(role))
+    in_memory = url.database in (None, '', ':memory:')
+    if role == REPLICA and in_memory and database_url(REPLICA) == database_url(PRIMARY):
+        engine = get_engine(PRIMARY)
+        _engines[role] = engine
+        _stats[role] = _stats[PRIMARY]
+        return engine
+
+    options = {}
+    if in_memory:
+        options.update({'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}})
+    engine = create_engine(url, echo=os.environ.get('SQL_ECHO', 'false').lower() == 'true', **options)
+    import models
+    models.Base.metadata.create_all(engine)
+    set_engine(role, engine)
+    return engine
+
+
+def set_engine(role, engine):
+    """Installs the engine used for a role, tracking its connection statistics."""
+    stats = {'host': engine.url.host, 'connects': 0, 'reconnects': 0, 'checkouts': 0, 'pings': 0}
+
+    def on_connect(dbapi_connection, connection_record):
+        if stats['connects'] > 0:
+            stats['reconnects'] = stats['reconnects'] + 1
+        stats['connects'] = stats['connects'] + 1
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats['checkouts'] = stats['checkouts'] + 1
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        remaining = deadline.remaining_ms()
+        if remaining is not None and remaining <= 0:
+            metrics.record('timeouts', 1, metrics.COUNT)
+            raise DeadlineExceeded('No time left to run: ' + ' '.join(statement.split()))
+        # Kept on the statement's own execution context: one that fails never reaches
+        # after_cursor_execute, and must not leave anything behind on the pooled connection
+        if context is not None:
+            context.query_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'query_started', None)
+        if started is None:
+            return
+        elapsed = (time.perf_counter() - started) * 1000.0
+        metrics.record('query', elapsed)
+        metrics.record('queries', 1, metrics.COUNT)
+        if _trace is not None:
+            _trace.add(statement, elapsed)
+        if elapsed >= SLOW_QUERY_MS:
+            logger.warning('Slow query ({0:.1f} ms): {1} with {2}'.format(
+                elapsed, ' '.join(statement.split()), json.dumps(redact(parameters, executemany))))
+
+    event.listen(engine, 'connect', on_connect)
+    event.listen(engine, 'checkout', on_checkout)
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    _engines[role] = engine
+    _stats[role] = stats
+    logger.info('Using {0} database engine at {1}'.format(role, engine.url.host))
+
+
+def limit_statements(engine):
+    """
+    Bounds each MySQL statement by the invocation's remaining time: SELECTs carry a
+    MAX_EXECUTION_TIME hint, and the socket timeout, set a little later, bounds every statement
+    (INSERT, UPDATE and the flush at commit included) and the commit itself, catching anything the
+    server does not stop on its own. Either way the statement fails with DeadlineExceeded; a
+    connection whose socket timed out is discarded rather than returned to the pool with a reply
+    still pending.
+    """
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        remaining = deadline.remaining_ms()
+        set_socket_timeout(conn.connection.connection, None if remaining is None else
+                           max(1, int(math.ceil((remaining + deadline.RESERVE_MS / 2) / 1000.0))))
+        if remaining is not None and statement[:6].upper() == 'SELECT':
+            statement = 'SELECT /*+ MAX_EXECUTION_TIME({0}) */'.format(max(1, int(remaining))) + statement[6:]
+        return statement, parameters
+
+    def handle_error(context):
+        error = context.original_exception
+        if is_socket_timeout(error):
+            context.is_disconnect = True
+            context.invalidate_pool_on_disconnect = False
+        elif getattr(error, 'errno', None) != ER_QUERY_TIMEOUT:
+            return
+        metrics.record('timeouts', 1, metrics.COUNT)
+        raise DeadlineExceeded('Statement cut off at the deadline: ' + str(error))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute, retval=True)
+    event.listen(engine, 'handle_error', handle_error)
+
+
+def set_socket_timeout(dbapi_connection, seconds):
+    """
+    Sets the timeout of a mysqlconnector connection's socket. mysql-connector-python-rf has no
+    read_timeout, so the pure Python connection's socket timeout is set instead. Its C extension
+    exposes neither; on it only SELECTs are bounded, by their hint.
+    """
+    if hasattr(dbapi_connection, 'read_timeout'):
+        dbapi_connection.read_timeout = seconds
+        return
+    sock = getattr(getattr(dbapi_connection, '_socket', None), 'sock', None)
+    if sock is not None:
+        sock.settimeout(seconds)
+
+
+def is_socket_timeout(error):
+    # Newer connectors raise their own timeout errors; mysql-connector-python-rf turns the socket's
+    # timeout into an OperationalError (2055, lost connection) raised while handling it
+    return type(error).__name__ in ('ReadTimeoutError', 'WriteTimeoutError') or \
+        (getattr(error, 'errno', None) == CR_SERVER_LOST_EXTENDED and isinstance(error.__context__, socket.timeout))
+
+
+def validate_idle_connections(engine, stats, ping_after, recycle_after):
+    """Validates pooled connections by how long they sat idle instead of pinging every checkout."""
+
+    def on_checkin(dbapi_connection, connection_record):
+        connection_record.info['checked_in'] = time.monotonic()
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        # Popped so the replacement connection the pool retries with is trusted
+        checked_in = connection_record.info.pop('checked_in', None)
+        if checked_in is None:
+            return
+        idle = time.monotonic() - checked_in
+        if idle >= recycle_after:
+            raise DisconnectionError('Connection idle for {0:.0f}s, replacing it'.format(idle))
+        if idle >= ping_after:
+            stats['pings'] = stats['pings'] + 1
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+            except Exception as e:
+                raise DisconnectionError('Ping failed after {0:.0f}s idle: {1}'.format(idle, e))
+            finally:
+                cursor.close()
+
+    event.listen(engine, 'checkin', on_checkin)
+    event.listen(engine, 'checkout', on_checkout)
+
+
+def engine_stats():
+    return dict((role, dict(stats)) for role, stats in _stats.items())
+
+
+def redact(parameters, executemany=False):
+    """Statement parameters with each value replaced by its type, safe to log."""
+    if executemany:
+        return {'rows': len(parameters), 'first': redact(parameters[0]) if parameters else None}
+
+    def placeholder(value):
+        return None if value is None else '<{0}>'.format(type(value).__name__)
+
+    if isinstance(parameters, dict):
+        return dict((name, placeholder(value)) for name, value in parameters.items())
+    return [placeholder(value) for value in parameters or ()]
+
+
+def begin_trace(verb):
+    """Starts tracing the statements of a request; the previous trace, if any, is discarded."""
+    global _trace
+    _trace = StatementTrace(verb)
+    return _trace
+
+
+def end_trace():
+    """Stops tracing, adding the request's statements to its verb's counts, and returns the trace."""
+    global _trace
+    trace, _trace = _trace, None
+    if trace is not None:
+        counts = _verb_statements.setdefault(trace.verb, {'requests': 0, 'statements': 0, 'last': 0, 'max': 0})
+        counts['requests'] = counts['requests'] + 1
+        counts['statements'] = counts['statements'] + trace.statements
+        counts['last'] = trace.statements
+        counts['max'] = max(counts['max'], trace.statements)
+    return trace
+
+
+def statement_counts(verb=None):
+    """Statements per verb: requests traced, total and maximum statements, and the last request's."""
+    if verb is not None:
+        return dict(_verb_statements.get(verb, {'requests': 0, 'statements': 0, 'last': 0, 'max': 0}))
+    return dict((name, dict(counts)) for name, counts in _verb_statements.items())
+
+
+def warmup(roles=(PRIMARY, REPLICA)):
+    """
+    Does the one-off work of a cold container up front: compiling the ORM mappers, building each
+    engine and opening a pooled connection. Returns the milliseconds spent in each phase.
+    """
+    timings = OrderedDict()
+
+    started = time.perf_counter()
+    import models
+    configure_mappers()
+    timings['mappers'] = (time.perf_counter() - started) * 1000.0
+
+    for role in roles:
+        started = time.perf_counter()
+        engine = get_engine(role)
+        timings[role + '_engine'] = (time.perf_counter() - started) * 1000.0
+
+        started = time.perf_counter()
+        engine.connect().close()
+        timings[role + '_connect'] = (time.perf_counter() - started) * 1000.0
+
+    logger.info('Warm-up phases (ms): ' + ', '.join('{0}={1:.1f}'.format(phase, elapsed)
+                                                    for phase, elapsed in timings.items()))
+    return timings
@@ -0,0 +1,59 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+The invocation's time budget, taken from the Lambda context.
+
+index.router starts it with the context it was given. Database statements are then limited to
+what is left, less RESERVE_MS kept back to roll back and return a response, and are refused once
+that is spent, so a slow query ends as a well-formed error instead of a killed invocation. Without
+a context, as when tests drive controllers directly, there is no deadline.
+"""
+import os
+
+RESERVE_MS = float(os.environ.get('DEADLINE_RESERVE_MS', 500))
+
+_context = None
+
+
+class DeadlineExceeded(Exception):
+    """Raised in place of a statement that was refused or cut off for lack of time."""
+
+
+def start(context):
+    global _context
+    _context = context if hasattr(context, 'get_remaining_time_in_millis') else None
+
+
+def finish():
+    global _context
+    _context = None
+
+
+def remaining_ms():
+    """Milliseconds left for statements, or None when there is no deadline."""
+    if _context is None:
+        return None
+    return _context.get_remaining_time_in_millis() - RESERVE_MS
+
+
+def check(what):
+    """Raises DeadlineExceeded instead of doing what is described once the budget is spent."""
+    remaining = remaining_ms()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded('No time left to ' + what)
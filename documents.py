@@ -0,0 +1,365 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Rendering of the Build-To-Us Booking and its optional materialized copy in booking_documents.
+
+A document is current while its version equals bookings.seq, which the bookings triggers bump on
+every change to the booking itself. Triggers on booking_rooms, booking_customers and customers
+delete the documents they affect. With BOOKING_DOCUMENTS=true, documents are written:
+
+- by ORM sessions, for every booking they changed, just before committing;
+- by ingest.py, for each chunk of bookings it inserts;
+- by GetBookingId and GetBookingIds on a miss: acknowledging writes store what they rendered, and
+  read-only calls render and store the missing documents in a short transaction on the primary.
+
+GetBookingId and GetBookingIds serve a current document as is. Documents can be verified and
+rebuilt from the command line:
+
+    python documents.py --check            # report documents that differ from a fresh render
+    python documents.py --check --repair   # and rewrite them
+    python documents.py --backfill         # render every booking without a current document
+"""
+import argparse
+import json
+import logging
+import os
+
+from decimal import Decimal
+from itertools import chain, groupby
+
+from sqlalchemy import and_, event, func, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+
+import database
+
+from encoder import dumps
+from models import Booking, BookingDocument, BookingRoom, Customer, booking_customers
+
+logger = logging.getLogger(__name__)
+
+if 'logging_level' in os.environ:
+    logger.setLevel(os.environ['logging_level'])
+else:
+    logger.setLevel('INFO')
+
+# Session.info key holding the booking ids (and customer emails) flushed since the last commit
+PENDING_BOOKINGS = 'booking_documents.bookings'
+PENDING_CUSTOMERS = 'booking_documents.customers'
+
+
+def enabled():
+    return os.environ.get('BOOKING_DOCUMENTS', 'false').lower() == 'true'
+
+
+def room_totals_query(session, booking_ids):
+    """MIN(dt), MAX(dt) and SUM(rate) of each room group of the bookings, as a derived table."""
+    return session.query(
+        BookingRoom.booking_id,
+        BookingRoom.room_type_id,
+        func.min(BookingRoom.dt).label('start_date'),
+        func.max(BookingRoom.dt).label('end_date'),
+        func.sum(BookingRoom.rate).label('price')).\
+        filter(BookingRoom.booking_id.in_(booking_ids)).\
+        group_by(BookingRoom.booking_id, BookingRoom.room_type_id).subquery()
+
+
+def day_rate_columns(room_totals):
+    return [BookingRoom.booking_id, BookingRoom.room_type_id, BookingRoom.dt, BookingRoom.description,
+            BookingRoom.rate, BookingRoom.rate_id, room_totals.c.start_date, room_totals.c.end_date,
+            room_totals.c.price]
+
+
+def day_rates_query(session, booking_ids):
+    """
+    Day rates of the bookings as plain tuples ordered by booking, room type and date. Each row carries
+    its room group's MIN(dt), MAX(dt) and SUM(rate), computed by MySQL in a derived table.
+    """
+    room_totals = room_totals_query(session, booking_ids)
+    return session.query(*day_rate_columns(room_totals)).\
+        join(room_totals, and_(room_totals.c.booking_id == BookingRoom.booking_id,
+                               room_totals.c.room_type_id == BookingRoom.room_type_id)).\
+        filter(BookingRoom.booking_id.in_(booking_ids)).\
+        order_by(BookingRoom.booking_id, BookingRoom.room_type_id, BookingRoom.dt)
+
+
+def load_booking(session, booking_id):
+    """
+    A booking with its customers and its day_rates_query rows, in a single statement. The day rates
+    are outer joined to the booking and come back once per customer; the repeats are skipped here.
+    Returns (None, []) for an unknown booking.
+    """
+    room_totals = room_totals_query(session, [booking_id])
+    query = session.query(Booking, *day_rate_columns(room_totals)).\
+        options(joinedload(Booking.customers)).\
+        outerjoin(BookingRoom, BookingRoom.booking_id == Booking.id).\
+        outerjoin(room_totals, and_(room_totals.c.booking_id == BookingRoom.booking_id,
+                                    room_totals.c.room_type_id == BookingRoom.room_type_id)).\
+        filter(Booking.id == booking_id).\
+        order_by(BookingRoom.room_type_id, BookingRoom.dt)
+    booking = None
+    day_rates = []
+    for row in query:
+        booking = row[0]
+        day_rate = tuple(row[1:])
+        if day_rate[0] is not None and (not day_rates or day_rates[-1][1:3] != day_rate[1:3]):
+            day_rates.append(day_rate)
+    return booking, day_rates
+
+
+def render_booking(order_id, booking, day_rates):
+    """Builds the Build-To-Us Booking from a booking with its customers and its day_rates_query rows."""
+    document = {
+        'OrderId': order_id,
+        'IsCancellation': booking.cancellation,
+        'OrderDate': booking.dttm.date(),
+        'OrderTime': booking.dttm.time().replace(microsecond=0),
+        'TotalCurrency': booking.currency,
+        'Customers': [],
+        'Rooms': []
+    }
+
+    # Adding customers from the booking
+    for customer in booking.customers:
+        document['Customers'].append({
+            'CustomerCountry': customer.country,
+            'CustomerEmail': customer.email,
+            'CustomerFName': customer.first_name,
+            'CustomerLName': customer.last_name
+        })
+
+    # Creating the individual room groups. Rates and dates stay Decimal and date, which the
+    # response encoder writes exactly.
+    total_price = Decimal(0)
+    group_dict = None
+    for booking_id, room_type_id, dt, description, rate, rate_id, start_date, end_date, price in day_rates:
+        if group_dict is None or group_dict['ChannelRoomType'] != room_type_id:
+            group_dict = {
+                'ChannelRoomType': room_type_id,
+                'Currency': booking.currency,
+                'DayRates': [],
+                'EndDate': end_date,
+                'StartDate': start_date,
+                'Price': price,
+                'Units': 1
+            }
+            document['Rooms'].append(group_dict)
+            total_price = total_price + price
+        group_dict['DayRates'].append({
+            'Date': dt,
+            'Description': description,
+            'Rate': rate,
+            'Currency': booking.currency,
+            'RateId': rate_id
+        })
+    document['TotalPrice'] = total_price
+    return document
+
+
+def render(session, booking_ids, user_id=None):
+    """
+    Freshly rendered documents of the existing bookings, optionally only the property's, as
+    {booking_id: (seq, json text)}.
+    """
+    booking_ids = list(booking_ids)
+    if not booking_ids:
+        return {}
+    query = session.query(Booking).options(joinedload(Booking.customers)).filter(Booking.id.in_(booking_ids))
+    if user_id is not None:
+        query = query.filter(Booking.user_id == user_id)
+    bookings = query.all()
+    day_rates = dict((booking_id, list(rows)) for booking_id, rows in
+                     groupby(day_rates_query(session, [booking.id for booking in bookings]), key=lambda row: row[0])) \
+        if bookings else {}
+    return dict((booking.id, (booking.seq, dumps(render_booking(booking.id, booking, day_rates.get(booking.id, [])))))
+                for booking in bookings)
+
+
+def load(session, booking_ids, user_id=None):
+    """Current documents of the bookings as {booking_id: json text}, optionally only the property's."""
+    booking_ids = list(booking_ids)
+    if not booking_ids:
+        return {}
+    query = session.query(BookingDocument.booking_id, BookingDocument.document).\
+        join(Booking, and_(Booking.id == BookingDocument.booking_id, Booking.seq == BookingDocument.version)).\
+        filter(BookingDocument.booking_id.in_(booking_ids))
+    if user_id is not None:
+        query = query.filter(Booking.user_id == user_id)
+    return dict(query)
+
+
+def store(session, documents):
+    """Replaces the stored documents with {booking_id: (seq, json text)}."""
+    if not documents:
+        return
+    session.query(BookingDocument).filter(BookingDocument.booking_id.in_(list(documents.keys()))).\
+        delete(synchronize_session=False)
+    session.execute(BookingDocument.__table__.insert(),
+                    [{'booking_id': booking_id, 'version': seq, 'document': document}
+                     for booking_id, (seq, document) in documents.items()])
+
+
+def materialize(session, booking_ids):
+    """Re-renders and stores the documents of the bookings, returning how many were written."""
+    documents = render(session, booking_ids)
+    store(session, documents)
+    return len(documents)
+
+
+def materialize_on_primary(session, booking_ids, user_id=None):
+    """
+    Renders and stores the documents of the bookings on the primary, returning {booking_id: json
+    text}. Read-only verbs use it on a miss: a replica session cannot write, and may lag behind the
+    booking_rooms change that deleted the document. A session already on the primary holds a
+    connection from its pool, the only one in lambda mode, so the documents are written through it
+    rather than through a second checkout that would wait out the pool timeout.
+    """
+    if session.get_bind().engine is database.get_engine(database.PRIMARY):
+        documents = render(session, booking_ids, user_id)
+        # A read-only session writes in a short transaction of its own; inside a writing Batch the
+        # documents commit with the Batch
+        store_quietly(session, documents, session.begin() if session.autocommit else session.begin_nested())
+    else:
+        primary = Session(bind=database.get_engine(database.PRIMARY))
+        try:
+            documents = render(primary, booking_ids, user_id)
+            store_quietly(primary, documents, primary.begin_nested())
+            primary.commit()
+        finally:
+            primary.close()
+    return dict((booking_id, document) for booking_id, (seq, document) in documents.items())
+
+
+def store_quietly(session, documents, transaction):
+    """Stores the documents in the transaction, leaving them to a concurrent request that stored them first."""
+    try:
+        with transaction:
+            store(session, documents)
+    except IntegrityError:
+        pass
+
+
+def check(session, repair=False, batch_size=500):
+    """
+    Compares every stored document that is still current against a fresh render. Returns the ids of
+    the bookings whose documents differ, rewriting them when repair is set.
+    """
+    mismatched = []
+    last_id = ''
+    while True:
+        stored = session.query(BookingDocument.booking_id, BookingDocument.version, BookingDocument.document).\
+            filter(BookingDocument.booking_id > last_id).\
+            order_by(BookingDocument.booking_id).limit(batch_size).all()
+        if not stored:
+            break
+        last_id = stored[-1][0]
+        fresh = render(session, [booking_id for booking_id, version, document in stored])
+        for booking_id, version, document in stored:
+            if booking_id not in fresh:
+                continue
+            seq, expected = fresh[booking_id]
+            if version == seq and json.loads(document) != json.loads(expected):
+                logger.warning('Booking document for {0} differs from a fresh render'.format(booking_id))
+                mismatched.append(booking_id)
+    if repair and mismatched:
+        materialize(session, mismatched)
+    return mismatched
+
+
+def backfill(session, batch_size=500):
+    """Materializes every booking without a current document, returning how many were written."""
+    written = 0
+    last_id = ''
+    while True:
+        booking_ids = [row[0] for row in session.query(Booking.id).
+                       outerjoin(BookingDocument, and_(BookingDocument.booking_id == Booking.id,
+                                                       BookingDocument.version == Booking.seq)).
+                       filter(BookingDocument.booking_id.is_(None)).filter(Booking.id > last_id).
+                       order_by(Booking.id).limit(batch_size)]
+        if not booking_ids:
+            return written
+        last_id = booking_ids[-1]
+        written = written + materialize(session, booking_ids)
+        session.commit()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    if not enabled():
+        return
+    bookings = session.info.setdefault(PENDING_BOOKINGS, set())
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, Booking):
+            # Acknowledging with a MyAllocator guid does not change the document
+            state = inspect(instance)
+            if instance in session.dirty and \
+                    not any(attr.history.has_changes() for attr in state.attrs if attr.key != 'guid'):
+                continue
+            bookings.add(instance.id)
+        elif isinstance(instance, BookingRoom):
+            bookings.add(instance.booking_id)
+        elif isinstance(instance, Customer) and instance not in session.new:
+            session.info.setdefault(PENDING_CUSTOMERS, set()).add(instance.email)
+
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_documents(session):
+    if not enabled():
+        return
+    session.flush()
+    customers = session.info.pop(PENDING_CUSTOMERS, None)
+    bookings = session.info.pop(PENDING_BOOKINGS, set())
+    if customers:
+        bookings.update(row[0] for row in session.execute(
+            booking_customers.select().with_only_columns([booking_customers.c.booking_id]).
+            where(booking_customers.c.email.in_(list(customers)))))
+    if bookings:
+        materialize(session, bookings)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(PENDING_BOOKINGS, None)
+    session.info.pop(PENDING_CUSTOMERS, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify or rebuild the materialized booking documents.')
+    parser.add_argument('--check', action='store_true', help='compare stored documents with a fresh render')
+    parser.add_argument('--repair', action='store_true', help='rewrite the documents --check finds')
+    parser.add_argument('--backfill', action='store_true', help='render bookings without a current document')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('logging_level', 'INFO'))
+    session = Session(bind=database.get_engine(database.PRIMARY))
+    try:
+        if args.backfill:
+            print('Materialized {0} booking documents'.format(backfill(session)))
+        if args.check:
+            mismatched = check(session, repair=args.repair)
+            session.commit()
+            print('{0} booking documents differ{1}'.format(len(mismatched), ', repaired' if args.repair else ''))
+            if mismatched and not args.repair:
+                raise SystemExit(1)
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Response encoding. Controllers put Decimal, date, time and datetime values straight into their
+data: decimals are written as exact JSON numbers (32.25, never 32.250000000000001) and the others in
+ISO 8601, as Build-To-Us expects. RawJSON values are spliced in verbatim.
+
+Both backends write a decimal of up to 15 characters in plain notation (any DECIMAL(15,2) amount)
+through its float, whose shortest repr reads back as the same value: 100.00 becomes 100.0. Longer
+ones and those with an exponent are written in their own notation.
+
+orjson is used when installed (3.9 or later, for exact decimals, which needs Python 3.7 or later),
+otherwise the standard library. JSON_ENCODER=stdlib or orjson forces a backend; register() adds
+others.
+"""
+import json
+import os
+import re
+import uuid
+
+from datetime import date, datetime, time
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RawJSON(object):
+    """Already serialized JSON that dumps() splices into a response verbatim."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def decimal_text(value):
+    if not value.is_finite():
+        raise ValueError('{0} is not a JSON number'.format(value))
+    return str(value)
+
+
+def decimal_number(value):
+    """The float written for a Decimal, or None when its exact text has to be written instead."""
+    text = str(value)
+    if len(text) <= 15 and 'E' not in text and value.is_finite():
+        number = float(value)
+        # Below 1e-4 the float's repr switches to an exponent
+        if number == 0 or not -1e-4 < number < 1e-4:
+            return number
+    return None
+
+
+def stdlib_dumps(data):
+    # The json module cannot emit raw numbers, so decimals without a float of their own and RawJSON
+    # are written as placeholder strings and replaced in a single pass afterwards; a response with
+    # none skips the pass. Responses are trees built by the controllers, so the circular reference
+    # check is skipped; it costs as much again as the default() calls.
+    fragments = []
+    nonce = uuid.uuid4().hex
+    isoformats = {}
+
+    def default(value):
+        kind = type(value)
+        if kind is date or kind is datetime or kind is time:
+            # Bookings repeat their dates: every room of a stay covers the same nights
+            text = isoformats.get(value)
+            if text is None:
+                text = isoformats[value] = value.isoformat()
+            return text
+        if isinstance(value, Decimal):
+            number = decimal_number(value)
+            if number is not None:
+                return number
+            fragments.append(decimal_text(value))
+        elif isinstance(value, RawJSON):
+            fragments.append(value.text)
+        elif isinstance(value, (date, time)):
+            return value.isoformat()
+        else:
+            raise TypeError('Object of type {0} is not JSON serializable'.format(type(value).__name__))
+        return '\x00{0}:{1}\x00'.format(nonce, len(fragments) - 1)
+
+    text = json.dumps(data, default=default, separators=(',', ':'),
+                      check_circular=False)
+    if not fragments:
+        return text
+    return re.sub(r'"\\u0000' + nonce + r':(\d+)\\u0000"', lambda match: fragments[int(match.group(1))], text)
+
+
+def orjson_dumps(data):
+    return orjson.dumps(data, default=_orjson_default).decode('utf-8')
+
+
+def _orjson_default(value):
+    if isinstance(value, Decimal):
+        number = decimal_number(value)
+        return orjson.Fragment(decimal_text(value)) if number is None else number
+    if isinstance(value, RawJSON):
+        return orjson.Fragment(value.text)
+    raise TypeError('Object of type {0} is not JSON serializable'.format(type(value).__name__))
+
+
+BACKENDS = {'stdlib': stdlib_dumps}
+if orjson is not None and hasattr(orjson, 'Fragment'):
+    BACKENDS['orjson'] = orjson_dumps
+
+
+def register(name, function):
+    """Adds a backend: a function taking the data and returning its JSON text."""
+    BACKENDS[name] = function
+
+
+def backend_name():
+    name = os.environ.get('JSON_ENCODER', 'auto')
+    if name == 'auto':
+        return 'orjson' if 'orjson' in BACKENDS else 'stdlib'
+    return name
+
+
+def dumps(data):
+    return BACKENDS[backend_name()](data)
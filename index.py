@@ -16,32 +16,83 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import time
+
+_import_started = time.perf_counter()
+
 import json
+import logging
+import os
+import traceback
+
+import deadline
+import metrics
+import registry
+
+from base import MA_OTA_PARAM_VERB
+
+logger = logging.getLogger(__name__)
+
+if 'logging_level' in os.environ:
+    logger.setLevel(os.environ['logging_level'])
+else:
+    logger.setLevel('INFO')
+
+# Direct invocations such as {"warmup": true} only prepare the container
+WARMUP_EVENT = 'warmup'
+
+import_timings = {'imports': (time.perf_counter() - _import_started) * 1000.0}
 
-from controllers import SetupPropertyDatabaseController, GetRoomTypesDatabaseController
-from controllers import GetBookingListController, GetBookingIdController, BaseController
-from controllers import MA_OTA_PARAM_VERB
+
+def warmup():
+    timings = dict(import_timings)
+
+    started = time.perf_counter()
+    registry.load_all()
+    import database
+    timings['controllers'] = (time.perf_counter() - started) * 1000.0
+
+    timings.update(database.warmup())
+    return timings
+
+
+# Provisioned concurrency runs module init before the first request, so do the database work here
+if os.environ.get('WARMUP_ON_INIT', 'false').lower() == 'true':
+    try:
+        warmup()
+    except Exception:
+        logger.error(traceback.format_exc())
 
 
 def router(event, context):
-    # Body nested via API Gateway
-    if 'body' in event:
-        body = json.loads(event['body'])
-    else:
-        body = event
-
-    if MA_OTA_PARAM_VERB in body and body[MA_OTA_PARAM_VERB] == 'SetupProperty':
-        controller = SetupPropertyDatabaseController(body)
-    elif MA_OTA_PARAM_VERB in body and body[MA_OTA_PARAM_VERB] == 'GetRoomTypes':
-        controller = GetRoomTypesDatabaseController(body)
-    elif MA_OTA_PARAM_VERB in body and body[MA_OTA_PARAM_VERB] == 'GetBookingList':
-        controller = GetBookingListController(body)
-    elif MA_OTA_PARAM_VERB in body and body[MA_OTA_PARAM_VERB] == 'GetBookingId':
-        controller = GetBookingIdController(body)
-    else:
-        controller = BaseController(body)
-
-    data = controller.handle()
+    if event.get(WARMUP_EVENT):
+        try:
+            data = {'success': True, 'timings': warmup()}
+        except Exception:
+            logger.error(traceback.format_exc())
+            data = {'success': False, 'errors': [{'type': 'api', 'msg': 'Warm-up failed'}]}
+        return {'statusCode': 200,
+                'body': json.dumps(data),
+                'headers': {'Content-Type': 'application/json'}}
+
+    invocation = metrics.start()
+    deadline.start(context)
+    try:
+        # Body nested via API Gateway
+        with metrics.timed('parse'):
+            if 'body' in event:
+                body = json.loads(event['body'])
+            else:
+                body = event
+        invocation.verb = body.get(MA_OTA_PARAM_VERB)
+
+        controller = registry.controller_for(body.get(MA_OTA_PARAM_VERB))(body)
+
+        data = controller.handle()
+    finally:
+        # A warm container must not carry this invocation's deadline or metrics into the next one
+        deadline.finish()
+        metrics.finish()
 
     return {'statusCode': 200,
             'body': data,
@@ -0,0 +1,198 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Bulk booking ingestion, e.g. a backfill from a PMS. Reads bookings from NDJSON, one per line, into
+the database named by the DB_* environment variables (or DB_URL):
+
+    {"id": "...", "ota_property_id": "hotel@example.com", "dttm": "2018-06-01T12:00:00",
+     "currency": "USD", "cancellation": false,
+     "customers": [{"email": "...", "country": "US", "first_name": "John", "last_name": "Doe"}],
+     "rooms": [{"room_type_id": "...", "dt": "2018-07-01", "rate": "120.00", "description": "Night 1",
+                "rate_id": null}]}
+
+Customers without a first_name or last_name get empty ones, as the schema requires names.
+
+Input is streamed and written chunk by chunk, each chunk in its own transaction: customers are
+upserted by email, then bookings, their customers and their nights are inserted with executemany,
+which mysqlconnector sends as multi-row INSERTs of at most ROWS_PER_STATEMENT rows. Bookings
+that already exist are skipped, so an interrupted run can simply be started again. With
+BOOKING_DOCUMENTS=true each chunk also stores the materialized documents of its bookings.
+
+    python ingest.py bookings.ndjson --chunk-size 500 --pause 0.05
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.mysql import insert
+
+import documents
+
+from models import Booking, BookingRoom, Customer, booking_customers
+from provision import chunked
+
+logger = logging.getLogger(__name__)
+
+if 'logging_level' in os.environ:
+    logger.setLevel(os.environ['logging_level'])
+else:
+    logger.setLevel('INFO')
+
+ROWS_PER_STATEMENT = 1000
+
+CUSTOMER_FIELDS = ['country', 'first_name', 'last_name']
+
+
+def customer_upsert_statement():
+    statement = insert(Customer.__table__)
+    return statement.on_duplicate_key_update(OrderedDict(
+        (name, statement.inserted[name]) for name in CUSTOMER_FIELDS))
+
+
+def sqlite_customer_upsert_statement():
+    """
+    The same upsert for the SQLite stand-in database, which spells it ON CONFLICT ... DO UPDATE. Rows
+    that would not change are left alone, so their update trigger does not fire.
+    """
+    columns = ['email'] + CUSTOMER_FIELDS
+    return text('INSERT INTO customers ({0}) VALUES ({1}) ON CONFLICT (email) DO UPDATE SET {2} WHERE {3}'.format(
+        ', '.join(columns), ', '.join(':' + name for name in columns),
+        ', '.join('{0} = excluded.{0}'.format(name) for name in CUSTOMER_FIELDS),
+        ' OR '.join('{0} IS NOT excluded.{0}'.format(name) for name in CUSTOMER_FIELDS))).\
+        bindparams(*[bindparam(name, type_=Customer.__table__.c[name].type) for name in columns])
+
+
+CUSTOMER_UPSERT = customer_upsert_statement()
+SQLITE_CUSTOMER_UPSERT = sqlite_customer_upsert_statement()
+
+
+def parse_booking(line):
+    """One NDJSON line as (bookings row, customers rows, booking_rooms rows)."""
+    entry = json.loads(line)
+    booking_id = str(entry['id'])
+    booking = {
+        'id': booking_id,
+        'user_id': str(entry['ota_property_id']),
+        'dttm': datetime.strptime(entry['dttm'].replace('T', ' '), '%Y-%m-%d %H:%M:%S'),
+        'currency': entry.get('currency') or 'USD',
+        'cancellation': bool(entry.get('cancellation', False)),
+        'myallocator_guid': entry.get('myallocator_guid')
+    }
+    customers = [{'email': str(customer['email']), 'country': customer.get('country') or 'US',
+                  'first_name': customer.get('first_name') or '', 'last_name': customer.get('last_name') or ''}
+                 for customer in entry.get('customers') or []]
+    rooms = [{'booking_id': booking_id, 'room_type_id': str(room['room_type_id']),
+              'dt': datetime.strptime(room['dt'], '%Y-%m-%d').date(), 'rate': Decimal(str(room['rate'])),
+              'description': room.get('description'), 'rate_id': room.get('rate_id')}
+             for room in entry.get('rooms') or []]
+    return booking, customers, rooms
+
+
+def execute_in_batches(session, statement, rows):
+    for start in range(0, len(rows), ROWS_PER_STATEMENT):
+        session.execute(statement, rows[start:start + ROWS_PER_STATEMENT])
+
+
+def write_chunk(session, parsed):
+    """Writes one chunk of parsed bookings in a transaction, returning (bookings, nights) written."""
+    existing = set(row[0] for row in session.query(Booking.id).
+                   filter(Booking.id.in_([booking['id'] for booking, customers, rooms in parsed])))
+    customers = OrderedDict()
+    bookings, links, nights = [], [], []
+    for booking, booking_customer_rows, rooms in parsed:
+        if booking['id'] in existing:
+            continue
+        existing.add(booking['id'])
+        bookings.append(booking)
+        for email in OrderedDict((customer['email'], None) for customer in booking_customer_rows):
+            links.append({'booking_id': booking['id'], 'email': email})
+        # The last line mentioning a customer decides their details
+        customers.update((customer['email'], customer) for customer in booking_customer_rows)
+        nights.extend(rooms)
+    if not bookings:
+        session.rollback()
+        return 0, 0
+
+    upsert = SQLITE_CUSTOMER_UPSERT if session.get_bind().dialect.name == 'sqlite' else CUSTOMER_UPSERT
+    try:
+        execute_in_batches(session, upsert, sorted(customers.values(), key=lambda customer: customer['email']))
+        execute_in_batches(session, Booking.__table__.insert(), bookings)
+        execute_in_batches(session, booking_customers.insert(), links)
+        execute_in_batches(session, BookingRoom.__table__.insert(), nights)
+        if documents.enabled():
+            documents.materialize(session, [booking['id'] for booking in bookings])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return len(bookings), len(nights)
+
+
+def ingest(session, lines, chunk_size=500, pause=0.0):
+    """
+    Ingests NDJSON bookings from an iterable of lines, holding one chunk in memory at a time and
+    sleeping pause seconds after each commit. Returns (bookings read, written, nights written).
+    """
+    read = written = nights = 0
+    for chunk in chunked((line for line in lines if line.strip()), chunk_size):
+        parsed = [parse_booking(line) for line in chunk]
+        chunk_written, chunk_nights = write_chunk(session, parsed)
+        read = read + len(parsed)
+        written = written + chunk_written
+        nights = nights + chunk_nights
+        logger.info('Ingested {0} bookings ({1} new, {2} nights)'.format(read, written, nights))
+        if pause:
+            time.sleep(pause)
+    return read, written, nights
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream bookings from an NDJSON file into the database.')
+    parser.add_argument('path', help="NDJSON bookings file, or '-' for standard input")
+    parser.add_argument('--chunk-size', type=int, default=500, help='bookings per transaction')
+    parser.add_argument('--pause', type=float, default=0.0, help='seconds to wait after each chunk')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('logging_level', 'INFO'))
+    import database
+    from sqlalchemy.orm import Session
+    session = Session(bind=database.get_engine(database.PRIMARY))
+    started = time.perf_counter()
+    try:
+        if args.path == '-':
+            read, written, nights = ingest(session, sys.stdin, args.chunk_size, args.pause)
+        else:
+            with open(args.path) as lines:
+                read, written, nights = ingest(session, lines, args.chunk_size, args.pause)
+    finally:
+        session.close()
+    print(json.dumps({'bookings': read, 'written': written, 'skipped': read - written, 'nights': nights,
+                      'seconds': round(time.perf_counter() - started, 3)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Per-invocation phase timings, written to stdout as one CloudWatch Embedded Metric Format line.
+
+index.router starts an invocation and finishes it after the response is serialized; the code in
+between wraps its phases in timed() or calls record() directly. Phases nest (action includes auth
+and query), and a phase entered more than once accumulates. With no invocation started, as when
+tests drive controllers directly, both are no-ops.
+"""
+import json
+import os
+import sys
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'MyAllocatorOTA')
+
+MILLISECONDS = 'Milliseconds'
+COUNT = 'Count'
+
+_cold_start = True
+current = None
+
+
+def enabled():
+    # Off by default outside Lambda so local runs and tests keep a quiet stdout
+    default = 'true' if 'AWS_LAMBDA_FUNCTION_NAME' in os.environ else 'false'
+    return bool(NAMESPACE) and os.environ.get('METRICS', default).lower() == 'true'
+
+
+class Invocation(object):
+
+    def __init__(self, cold_start):
+        self.verb = None
+        self.cold_start = cold_start
+        self.started = time.perf_counter()
+        self.values = OrderedDict()
+        self.units = {}
+
+    def record(self, name, value, unit=MILLISECONDS):
+        self.values[name] = self.values.get(name, 0) + value
+        self.units[name] = unit
+
+    def document(self):
+        values = OrderedDict(self.values)
+        units = dict(self.units)
+        values['total'] = (time.perf_counter() - self.started) * 1000.0
+        units['total'] = MILLISECONDS
+        document = OrderedDict([
+            ('_aws', {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Verb', 'Start']],
+                    'Metrics': [{'Name': name, 'Unit': units[name]} for name in values]
+                }]
+            }),
+            ('Verb', self.verb if isinstance(self.verb, str) else 'Unknown'),
+            ('Start', 'cold' if self.cold_start else 'warm')
+        ])
+        for name, value in values.items():
+            document[name] = round(value, 3) if units[name] == MILLISECONDS else value
+        return document
+
+
+def start():
+    """Begins timing an invocation; the first one in a container is tagged as the cold start."""
+    global _cold_start, current
+    current = Invocation(_cold_start)
+    _cold_start = False
+    return current
+
+
+def finish():
+    """Writes the current invocation's metrics line, returning its document (None when disabled)."""
+    global current
+    invocation, current = current, None
+    if invocation is None or not enabled():
+        return None
+    document = invocation.document()
+    sys.stdout.write(json.dumps(document) + '\n')
+    return document
+
+
+def record(name, value, unit=MILLISECONDS):
+    if current is not None:
+        current.record(name, value, unit)
+
+
+@contextmanager
+def timed(phase):
+    invocation = current
+    if invocation is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation.record(phase, (time.perf_counter() - started) * 1000.0)
@@ -0,0 +1,114 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Applies the numbered SQL files in migrations/ to the database named by the DB_* environment
+variables, recording each one in the schema_migrations table. schema.sql already contains every
+migration, so a fresh database only needs it; existing databases are brought up to date with:
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending migrations
+"""
+import argparse
+import glob
+import logging
+import os
+import re
+
+from sqlalchemy import create_engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def split_statements(script):
+    """Splits a SQL script on its delimiter, honouring mysql client style DELIMITER lines."""
+    delimiter = ';'
+    statements = []
+    current = []
+    for line in script.splitlines():
+        match = re.match(r'^\s*DELIMITER\s+(\S+)\s*$', line, re.IGNORECASE)
+        if match:
+            delimiter = match.group(1)
+            continue
+        if line.rstrip().endswith(delimiter):
+            current.append(line.rstrip()[:-len(delimiter)])
+            statements.append('\n'.join(current))
+            current = []
+        else:
+            current.append(line)
+    statements.append('\n'.join(current))
+
+    # Dropping chunks that are only whitespace and comments
+    return [statement.strip() for statement in statements
+            if re.sub(r'^\s*--.*$', '', statement, flags=re.MULTILINE).strip()]
+
+
+def available_migrations():
+    migrations = []
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '*.sql'))):
+        migrations.append((os.path.basename(path)[:-len('.sql')], path))
+    return migrations
+
+
+def applied_migrations(cursor):
+    cursor.execute('create table if not exists schema_migrations ('
+                   'version varchar(64) primary key, '
+                   'applied_at datetime not null default now())')
+    cursor.execute('select version from schema_migrations')
+    return set(row[0] for row in cursor.fetchall())
+
+
+def migrate(engine, status_only=False):
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        applied = applied_migrations(cursor)
+        pending = [(version, path) for version, path in available_migrations() if version not in applied]
+        if status_only:
+            for version, path in available_migrations():
+                print('{0} {1}'.format('applied' if version in applied else 'pending', version))
+            return pending
+
+        for version, path in pending:
+            logger.info('Applying migration {0}'.format(version))
+            with open(path) as script:
+                for statement in split_statements(script.read()):
+                    cursor.execute(statement)
+            cursor.execute('insert into schema_migrations (version) values (%s)', (version,))
+            connection.commit()
+        return pending
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply pending schema migrations.')
+    parser.add_argument('--status', action='store_true', help='list migrations without applying them')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('logging_level', 'INFO'))
+    engine = create_engine('mysql+mysqlconnector://' + os.environ['DB_USER'] + ':' +
+                           os.environ['DB_PASS'] + '@' + os.environ['DB_HOST'] + '/' +
+                           os.environ['DB_NAME'])
+    migrate(engine, status_only=args.status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+-- Per-property booking change sequence used as the GetBookingList version.
+
+alter table users add column booking_seq bigint not null default 0;
+alter table bookings add column seq bigint not null default 0;
+
+-- Existing bookings are numbered per property in (dttm, id) order
+set @seq = 0, @user_id = null;
+update bookings b join (
+  select id,
+         @seq := if(@user_id = user_id, @seq + 1, 1) as seq,
+         @user_id := user_id as user_id
+  from bookings
+  order by user_id, dttm, id
+) numbered on numbered.id = b.id
+set b.seq = numbered.seq;
+
+update users u set booking_seq = (select coalesce(max(b.seq), 0) from bookings b where b.user_id = u.id);
+
+DELIMITER ;;
+
+create trigger bookings_seq_insert before insert on bookings for each row
+begin
+  update users set booking_seq = booking_seq + 1 where id = NEW.user_id;
+  set NEW.seq = (select booking_seq from users where id = NEW.user_id);
+end;;
+
+create trigger bookings_seq_update before update on bookings for each row
+begin
+  if NEW.dttm <> OLD.dttm or NEW.cancellation <> OLD.cancellation or NEW.currency <> OLD.currency
+      or NEW.user_id <> OLD.user_id then
+    update users set booking_seq = booking_seq + 1 where id = NEW.user_id;
+    set NEW.seq = (select booking_seq from users where id = NEW.user_id);
+  end if;
+end;;
+
+DELIMITER ;
@@ -0,0 +1,6 @@
+-- Covering index for GetBookingList. Both the sequence poll and the legacy timestamp poll filter
+-- on (user_id, myallocator_guid IS NULL) and read id, seq and dttm; id comes from the primary key.
+-- GetRoomTypes already uses the index InnoDB created for the room_types.user_id foreign key, and
+-- it cannot be covered because it reads the TEXT detail column.
+
+create index bookings_poll on bookings (user_id, myallocator_guid, seq, dttm);
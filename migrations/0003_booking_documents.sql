@@ -0,0 +1,44 @@
+-- Optional materialized Build-To-Us Booking documents (BOOKING_DOCUMENTS=true). A document is
+-- current while its version matches bookings.seq; changes to a booking's rooms or customers
+-- delete its document, and the application renders it again on the next write or read.
+create table booking_documents (
+  booking_id varchar(36) primary key,
+  version bigint not null,
+  document mediumtext not null,
+  foreign key (booking_id) references bookings(id) on delete cascade
+);
+
+DELIMITER ;;
+
+create trigger booking_rooms_document_insert after insert on booking_rooms for each row
+begin
+  delete from booking_documents where booking_id = NEW.booking_id;
+end;;
+
+create trigger booking_rooms_document_update after update on booking_rooms for each row
+begin
+  delete from booking_documents where booking_id in (OLD.booking_id, NEW.booking_id);
+end;;
+
+create trigger booking_rooms_document_delete after delete on booking_rooms for each row
+begin
+  delete from booking_documents where booking_id = OLD.booking_id;
+end;;
+
+create trigger booking_customers_document_insert after insert on booking_customers for each row
+begin
+  delete from booking_documents where booking_id = NEW.booking_id;
+end;;
+
+create trigger booking_customers_document_delete after delete on booking_customers for each row
+begin
+  delete from booking_documents where booking_id = OLD.booking_id;
+end;;
+
+create trigger customers_document_update after update on customers for each row
+begin
+  delete from booking_documents where booking_id in
+    (select booking_id from booking_customers where email = NEW.email);
+end;;
+
+DELIMITER ;
@@ -0,0 +1,15 @@
+-- Availability, rates and restrictions pushed by MyAllocator's ARIUpdate, one row per room type
+-- and date. NULL means the value has never been sent.
+create table inventory (
+  room_type_id varchar(36) not null,
+  dt date not null,
+  units smallint,
+  rate decimal(15,2),
+  min_los smallint,
+  max_los smallint,
+  closed boolean,
+  closed_arrival boolean,
+  closed_departure boolean,
+  primary key (room_type_id, dt),
+  foreign key (room_type_id) references room_types(id) on delete cascade
+);
@@ -0,0 +1,23 @@
+-- Per-property room type catalogue version. Any write to a property's room types bumps it, so
+-- cached GetRoomTypes responses are valid exactly while their version matches.
+
+alter table users add column room_type_version bigint not null default 0;
+
+DELIMITER ;;
+
+create trigger room_types_version_insert after insert on room_types for each row
+begin
+  update users set room_type_version = room_type_version + 1 where id = NEW.user_id;
+end;;
+
+create trigger room_types_version_update after update on room_types for each row
+begin
+  update users set room_type_version = room_type_version + 1 where id in (OLD.user_id, NEW.user_id);
+end;;
+
+create trigger room_types_version_delete after delete on room_types for each row
+begin
+  update users set room_type_version = room_type_version + 1 where id = OLD.user_id;
+end;;
+
+DELIMITER ;
@@ -17,18 +17,26 @@
 # limitations under the License.
 #
 from bcrypt import gensalt, hashpw, checkpw
-from sqlalchemy import Column, String, Integer, Numeric, Boolean, Date, DateTime, ForeignKey, Table
+from sqlalchemy import Column, String, Integer, BigInteger, Numeric, Boolean, Date, DateTime, ForeignKey, Table, Text
+from sqlalchemy import DDL, FetchedValue, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
 
+def hash_password(password):
+    """The bcrypt hash stored in users.password, with a fresh salt."""
+    return hashpw(password.encode('utf-8'), gensalt()).decode()
+
+
 class User(Base):
 
     __tablename__ = 'users'
     id = Column(String, primary_key=True)
     myallocator_id = Column(String)
+    booking_seq = Column(BigInteger, nullable=False, server_default='0')
+    room_type_version = Column(BigInteger, nullable=False, server_default='0')
     __password = Column('password', String, nullable=False)
     room_types = relationship("RoomType", back_populates="user")
     bookings = relationship("Booking", back_populates="user")
@@ -45,8 +53,7 @@ class User(Base):
 
     @password.setter
     def password(self, value):
-        salt = gensalt()
-        self.__password = hashpw(value.encode('utf-8'), salt).decode()
+        self.__password = hash_password(value)
 
 
 class RoomType(Base):
@@ -67,7 +74,7 @@ class RoomType(Base):
 
 booking_customers = Table('booking_customers', Base.metadata,
     Column('booking_id', String, ForeignKey('bookings.id')),
-    Column('email', String, ForeignKey('customers.email'))
+    Column('email', String, ForeignKey('customers.email'), index=True)
 )
 
 
@@ -79,10 +86,13 @@ class Booking(Base):
     currency = Column(String, default='USD')
     cancellation = Column(Boolean, nullable=False, default=False)
     guid = Column('myallocator_guid', String)
+    seq = Column(BigInteger, nullable=False, server_default='0', server_onupdate=FetchedValue())
 
     user = relationship("User", back_populates="bookings")
-    booked_rooms = relationship("BookingRoom", back_populates="booking")
-    customers = relationship("Customer", secondary=booking_customers, back_populates="bookings")
+    booked_rooms = relationship("BookingRoom", back_populates="booking",
+                                order_by="[BookingRoom.room_type_id, BookingRoom.dt]")
+    customers = relationship("Customer", secondary=booking_customers, back_populates="bookings",
+                             order_by="Customer.email")
 
     def __repr__(self):
         return "<Booking(id='%s')>" % self.id
@@ -115,3 +125,102 @@ class BookingRoom(Base):
 
     def __repr__(self):
         return "<BookingRoom(booking_id='%s' room_id='%s', date='%s')>" % self.booking_id, self.room_type_id, str(self.dt)
+
+
+class BookingDocument(Base):
+    __tablename__ = 'booking_documents'
+    booking_id = Column(String, ForeignKey('bookings.id', ondelete='CASCADE'), primary_key=True)
+    version = Column(BigInteger, nullable=False)
+    document = Column(Text, nullable=False)
+
+    def __repr__(self):
+        return "<BookingDocument(booking_id='%s', version='%s')>" % (self.booking_id, self.version)
+
+
+class Inventory(Base):
+    __tablename__ = 'inventory'
+    room_type_id = Column(String, ForeignKey('room_types.id', ondelete='CASCADE'), primary_key=True)
+    dt = Column(Date, primary_key=True)
+    units = Column(Integer)
+    rate = Column(Numeric)
+    min_los = Column(Integer)
+    max_los = Column(Integer)
+    closed = Column(Boolean)
+    closed_arrival = Column(Boolean)
+    closed_departure = Column(Boolean)
+
+    room_type = relationship("RoomType")
+
+    def __repr__(self):
+        return "<Inventory(room_type_id='%s', date='%s')>" % (self.room_type_id, str(self.dt))
+
+
+# schema.sql creates the MySQL triggers. These are their SQLite equivalents, created along with the
+# tables by metadata.create_all for the local stand-in database. SQLite cannot assign NEW columns,
+# so the sequence is written back with an UPDATE after the row is stored.
+SQLITE_TRIGGERS = [
+    (Booking.__table__, """
+create trigger bookings_seq_insert after insert on bookings for each row
+begin
+  update users set booking_seq = booking_seq + 1 where id = NEW.user_id;
+  update bookings set seq = (select booking_seq from users where id = NEW.user_id) where id = NEW.id;
+end"""),
+    (Booking.__table__, """
+create trigger bookings_seq_update after update of dttm, cancellation, currency, user_id on bookings
+for each row
+when NEW.dttm <> OLD.dttm or NEW.cancellation <> OLD.cancellation or NEW.currency <> OLD.currency
+  or NEW.user_id <> OLD.user_id
+begin
+  update users set booking_seq = booking_seq + 1 where id = NEW.user_id;
+  update bookings set seq = (select booking_seq from users where id = NEW.user_id) where id = NEW.id;
+end"""),
+    (BookingRoom.__table__, """
+create trigger booking_rooms_document_insert after insert on booking_rooms for each row
+begin
+  delete from booking_documents where booking_id = NEW.booking_id;
+end"""),
+    (BookingRoom.__table__, """
+create trigger booking_rooms_document_update after update on booking_rooms for each row
+begin
+  delete from booking_documents where booking_id in (OLD.booking_id, NEW.booking_id);
+end"""),
+    (BookingRoom.__table__, """
+create trigger booking_rooms_document_delete after delete on booking_rooms for each row
+begin
+  delete from booking_documents where booking_id = OLD.booking_id;
+end"""),
+    (booking_customers, """
+create trigger booking_customers_document_insert after insert on booking_customers for each row
+begin
+  delete from booking_documents where booking_id = NEW.booking_id;
+end"""),
+    (booking_customers, """
+create trigger booking_customers_document_delete after delete on booking_customers for each row
+begin
+  delete from booking_documents where booking_id = OLD.booking_id;
+end"""),
+    (Customer.__table__, """
+create trigger customers_document_update after update on customers for each row
+begin
+  delete from booking_documents where booking_id in
+    (select booking_id from booking_customers where email = NEW.email);
+end"""),
+    (RoomType.__table__, """
+create trigger room_types_version_insert after insert on room_types for each row
+begin
+  update users set room_type_version = room_type_version + 1 where id = NEW.user_id;
+end"""),
+    (RoomType.__table__, """
+create trigger room_types_version_update after update on room_types for each row
+begin
+  update users set room_type_version = room_type_version + 1 where id in (OLD.user_id, NEW.user_id);
+end"""),
+    (RoomType.__table__, """
+create trigger room_types_version_delete after delete on room_types for each row
+begin
+  update users set room_type_version = room_type_version + 1 where id = OLD.user_id;
+end""")
+]
+
+for table, trigger in SQLITE_TRIGGERS:
+    event.listen(table, 'after_create', DDL(trigger.strip()).execute_if(dialect='sqlite'))
@@ -0,0 +1,178 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Bulk property provisioning: creates properties and their room types from a CSV or NDJSON file in the
+database named by the DB_* environment variables (or DB_URL). NDJSON has one property per line:
+
+    {"id": "hotel@example.com", "password": "...", "myallocator_id": null,
+     "room_types": [{"id": "...", "title": "Double", "detail": "", "occupancy": 2, "dorm": false}]}
+
+CSV has a header row and one row per room type, repeating the property's columns on each; a
+property's rows must be adjacent, and one without room types has a single row with the room type
+columns empty:
+
+    property_id,password,myallocator_id,room_type_id,title,detail,occupancy,dorm
+
+bcrypt dominates the cost, so passwords are hashed across a pool of worker processes, each chunk
+while the previous one is inserted. Users and room types are written with multi-row inserts and
+committed per chunk; a failing chunk is rolled back and stops the run.
+
+    python provision.py properties.ndjson --workers 4
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+from itertools import groupby, islice
+
+from models import User, RoomType, hash_password
+
+logger = logging.getLogger(__name__)
+
+if 'logging_level' in os.environ:
+    logger.setLevel(os.environ['logging_level'])
+else:
+    logger.setLevel('INFO')
+
+
+def parse_dorm(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ('1', 'true', 'yes'):
+        return True
+    if str(value).lower() in ('', '0', 'false', 'no'):
+        return False
+    raise ValueError('Not a boolean: {0}'.format(value))
+
+
+def room_type_row(property_id, room_type):
+    return {
+        'id': str(room_type['id']),
+        'user_id': property_id,
+        'title': room_type.get('title') or '',
+        'detail': room_type.get('detail'),
+        'occupancy': int(room_type['occupancy']),
+        'dorm': parse_dorm(room_type.get('dorm', False))
+    }
+
+
+def read_ndjson(lines):
+    for line in lines:
+        if line.strip():
+            entry = json.loads(line)
+            yield {'id': str(entry['id']), 'password': entry['password'],
+                   'myallocator_id': entry.get('myallocator_id'),
+                   'room_types': [room_type_row(str(entry['id']), room_type)
+                                  for room_type in entry.get('room_types') or []]}
+
+
+def read_csv(lines):
+    for property_id, rows in groupby(csv.DictReader(lines), key=lambda row: row['property_id']):
+        rows = list(rows)
+        yield {'id': property_id, 'password': rows[0]['password'],
+               'myallocator_id': rows[0].get('myallocator_id') or None,
+               'room_types': [room_type_row(property_id, {'id': row['room_type_id'], 'title': row.get('title'),
+                                                          'detail': row.get('detail'), 'occupancy': row['occupancy'],
+                                                          'dorm': row.get('dorm')})
+                              for row in rows if row.get('room_type_id')]}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def insert(session, properties, hashes):
+    """Writes one chunk of properties with their password hashes and commits it."""
+    users = [{'id': entry['id'], 'password': hashed, 'myallocator_id': entry['myallocator_id']}
+             for entry, hashed in zip(properties, hashes)]
+    room_types = [room_type for entry in properties for room_type in entry['room_types']]
+    try:
+        session.execute(User.__table__.insert(), users)
+        if room_types:
+            session.execute(RoomType.__table__.insert(), room_types)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return len(users), len(room_types)
+
+
+def provision(session, properties, workers=1, chunk_size=500):
+    """
+    Creates the properties, an iterable of dicts as read_ndjson() yields, hashing passwords in
+    workers processes (in this one when 1). Returns how many properties and room types were written.
+    """
+    # Spawned rather than forked, so no worker inherits the session's database connection
+    pool = multiprocessing.get_context('spawn').Pool(workers) if workers > 1 else None
+    written = [0, 0]
+    try:
+        previous = None
+        for chunk in chunked(properties, chunk_size):
+            passwords = [entry['password'] for entry in chunk]
+            if pool is None:
+                hashes = map(hash_password, passwords)
+            else:
+                hashes = pool.imap(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4)))
+            if previous is not None:
+                written = [total + count for total, count in zip(written, insert(session, *previous))]
+            previous = (chunk, hashes)
+        if previous is not None:
+            written = [total + count for total, count in zip(written, insert(session, *previous))]
+    finally:
+        # Every hash needed has been read by now
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return tuple(written)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create properties and room types from a CSV or NDJSON file.')
+    parser.add_argument('path', help='properties file, read as CSV when it ends in .csv and NDJSON otherwise')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='bcrypt worker processes')
+    parser.add_argument('--chunk-size', type=int, default=500, help='properties per insert and commit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('logging_level', 'INFO'))
+    import database
+    from sqlalchemy.orm import Session
+    session = Session(bind=database.get_engine(database.PRIMARY))
+    started = time.perf_counter()
+    try:
+        with open(args.path, newline='') as lines:
+            reader = read_csv if args.path.lower().endswith('.csv') else read_ndjson
+            properties, room_types = provision(session, reader(lines), args.workers, args.chunk_size)
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - started
+    print(json.dumps({'properties': properties, 'room_types': room_types, 'workers': args.workers,
+                      'seconds': round(elapsed, 3), 'properties_per_second': round(properties / elapsed, 1)}))
+
+
+if __name__ == '__main__':
+    main()
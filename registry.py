@@ -0,0 +1,58 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import importlib
+
+from base import BaseController
+
+# Module holding each verb's controller. Modules are imported the first time one of their verbs is
+# requested, so verbs handled by BaseController never load SQLAlchemy, the MySQL driver or bcrypt.
+VERB_MODULES = {
+    'SetupProperty': 'controllers',
+    'GetRoomTypes': 'controllers',
+    'GetBookingList': 'controllers',
+    'GetBookingId': 'controllers',
+    'GetBookingIds': 'controllers',
+    'ARIUpdate': 'ari',
+    'Batch': 'batch'
+}
+
+_controllers = {}
+
+
+def register(verb):
+    """Class decorator registering a controller as the handler for a verb."""
+    def decorator(controller):
+        _controllers[verb] = controller
+        return controller
+    return decorator
+
+
+def controller_for(verb):
+    if not isinstance(verb, str):
+        return BaseController
+    controller = _controllers.get(verb)
+    if controller is None and verb in VERB_MODULES:
+        importlib.import_module(VERB_MODULES[verb])
+        controller = _controllers.get(verb)
+    return controller if controller is not None else BaseController
+
+
+def load_all():
+    for module in sorted(set(VERB_MODULES.values())):
+        importlib.import_module(module)
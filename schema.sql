@@ -1,7 +1,23 @@
+-- Fresh databases start with every migration in migrations/ already applied;
+-- existing databases are upgraded with migrate.py.
+create table schema_migrations (
+  version varchar(64) primary key,
+  applied_at datetime not null default now()
+);
+
+insert into schema_migrations (version) values
+  ('0001_booking_change_seq'),
+  ('0002_polling_indexes'),
+  ('0003_booking_documents'),
+  ('0004_inventory'),
+  ('0005_room_type_version');
+
 create table users (
   id varchar(256) primary key,
   password varchar(256) not null,
-  myallocator_id varchar(128)
+  myallocator_id varchar(128),
+  booking_seq bigint not null default 0,
+  room_type_version bigint not null default 0
 );
 
 create table room_types(
@@ -21,7 +37,9 @@ create table bookings (
   currency varchar(3) not null default 'USD',
   cancellation boolean not null default false,
   myallocator_guid varchar(36),
-  foreign key (user_id) references users(id) on delete cascade
+  seq bigint not null default 0,
+  foreign key (user_id) references users(id) on delete cascade,
+  index bookings_poll (user_id, myallocator_guid, seq, dttm)
 );
 
 create table customers (
@@ -50,3 +68,98 @@ create table booking_customers (
   foreign key (booking_id) references bookings(id),
   foreign key (email) references customers(email)
 );
+
+-- Optional materialized Build-To-Us Booking documents (BOOKING_DOCUMENTS=true), current while
+-- version matches bookings.seq
+create table booking_documents (
+  booking_id varchar(36) primary key,
+  version bigint not null,
+  document mediumtext not null,
+  foreign key (booking_id) references bookings(id) on delete cascade
+);
+
+-- Availability, rates and restrictions pushed by MyAllocator's ARIUpdate, one row per room type
+-- and date. NULL means the value has never been sent.
+create table inventory (
+  room_type_id varchar(36) not null,
+  dt date not null,
+  units smallint,
+  rate decimal(15,2),
+  min_los smallint,
+  max_los smallint,
+  closed boolean,
+  closed_arrival boolean,
+  closed_departure boolean,
+  primary key (room_type_id, dt),
+  foreign key (room_type_id) references room_types(id) on delete cascade
+);
+
+-- Every booking insert, update or cancellation takes the next value of its property's
+-- users.booking_seq. The users row lock serializes writers per property, so sequence
+-- order is also commit order and GetBookingList can poll with seq > version.
+DELIMITER ;;
+
+create trigger bookings_seq_insert before insert on bookings for each row
+begin
+  update users set booking_seq = booking_seq + 1 where id = NEW.user_id;
+  set NEW.seq = (select booking_seq from users where id = NEW.user_id);
+end;;
+
+create trigger bookings_seq_update before update on bookings for each row
+begin
+  if NEW.dttm <> OLD.dttm or NEW.cancellation <> OLD.cancellation or NEW.currency <> OLD.currency
+      or NEW.user_id <> OLD.user_id then
+    update users set booking_seq = booking_seq + 1 where id = NEW.user_id;
+    set NEW.seq = (select booking_seq from users where id = NEW.user_id);
+  end if;
+end;;
+
+-- Changes to a booking's rooms or customers delete its materialized document
+create trigger booking_rooms_document_insert after insert on booking_rooms for each row
+begin
+  delete from booking_documents where booking_id = NEW.booking_id;
+end;;
+
+create trigger booking_rooms_document_update after update on booking_rooms for each row
+begin
+  delete from booking_documents where booking_id in (OLD.booking_id, NEW.booking_id);
+end;;
+
+create trigger booking_rooms_document_delete after delete on booking_rooms for each row
+begin
+  delete from booking_documents where booking_id = OLD.booking_id;
+end;;
+
+create trigger booking_customers_document_insert after insert on booking_customers for each row
+begin
+  delete from booking_documents where booking_id = NEW.booking_id;
+end;;
+
+create trigger booking_customers_document_delete after delete on booking_customers for each row
+begin
+  delete from booking_documents where booking_id = OLD.booking_id;
+end;;
+
+create trigger customers_document_update after update on customers for each row
+begin
+  delete from booking_documents where booking_id in
+    (select booking_id from booking_customers where email = NEW.email);
+end;;
+
+-- Any room type write bumps its property's catalogue version, invalidating cached GetRoomTypes
+create trigger room_types_version_insert after insert on room_types for each row
+begin
+  update users set room_type_version = room_type_version + 1 where id = NEW.user_id;
+end;;
+
+create trigger room_types_version_update after update on room_types for each row
+begin
+  update users set room_type_version = room_type_version + 1 where id in (OLD.user_id, NEW.user_id);
+end;;
+
+create trigger room_types_version_delete after delete on room_types for each row
+begin
+  update users set room_type_version = room_type_version + 1 where id = OLD.user_id;
+end;;
+
+DELIMITER ;
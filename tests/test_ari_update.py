@@ -0,0 +1,146 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+import database
+import index
+import uuid
+from datetime import date
+
+from controllers import *
+
+from sqlalchemy.orm import sessionmaker
+
+from ari import expand_inventory
+from models import User, RoomType, Inventory
+
+SHARED_SECRET = 'test123'
+
+os.environ['shared_secret'] = SHARED_SECRET
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
+
+
+class TestARIUpdate(unittest.TestCase):
+
+    password = 'supersecretpassword'
+
+    def _create_property(self, room_types=2):
+
+        # Building a new property with its room types
+        email = str(uuid.uuid4()) + '@gmail.com'
+        session = Session()
+        session.add(User(password=self.password, id=email))
+        session.commit()
+        room_type_ids = [str(uuid.uuid4()) for count in range(room_types)]
+        session.add_all([RoomType(id=room_type_id, user_id=email, title='Title', detail='Detail',
+                                  dorm=False, occupancy=1) for room_type_id in room_type_ids])
+        session.commit()
+        session.close()
+        return email, room_type_ids
+
+    def _ari_update(self, email, inventory):
+        return json.loads(index.router({
+            'verb': 'ARIUpdate',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': email,
+            'ota_property_password': self.password,
+            'shared_secret': SHARED_SECRET,
+            'Inventory': inventory
+        }, None)['body'])
+
+    def test_expand_inventory(self):
+
+        rows = expand_inventory([
+            ('b', date(2020, 1, 1), date(2020, 1, 3), {'units': 2}),
+            ('a', date(2020, 1, 2), date(2020, 1, 2), {'units': 1}),
+            ('b', date(2020, 1, 2), date(2020, 1, 2), {'rate': 10})
+        ])
+        self.assertEqual([(row['room_type_id'], row['dt'].day) for row in rows],
+                         [('a', 2), ('b', 1), ('b', 2), ('b', 3)])
+        self.assertEqual((rows[2]['units'], rows[2]['rate'], rows[2]['closed']), (2, 10, None))
+
+    def test_ari_update_upserts_ranges(self):
+
+        email, room_type_ids = self._create_property()
+        start_date = date.today()
+        end_date = start_date + timedelta(days=9)
+        body = self._ari_update(email, [
+            {'ota_room_id': room_type_id, 'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+             'units': 3, 'price': '99.50', 'min_los': 2, 'closed': False}
+            for room_type_id in room_type_ids])
+        self.assertEqual(body['success'], True, body)
+
+        # Closing one day keeps the other values already stored
+        body = self._ari_update(email, [{'ota_room_id': room_type_ids[0], 'start_date': start_date.isoformat(),
+                                         'end_date': start_date.isoformat(), 'closed': True}])
+        self.assertEqual(body['success'], True, body)
+
+        session = Session()
+        rows = session.query(Inventory).filter(Inventory.room_type_id.in_(room_type_ids)).\
+            order_by(Inventory.room_type_id, Inventory.dt).all()
+        self.assertEqual(len(rows), 20)
+        closed = session.query(Inventory).get((room_type_ids[0], start_date))
+        self.assertEqual((closed.units, float(closed.rate), closed.min_los, closed.closed), (3, 99.5, 2, True))
+        self.assertEqual(sum(1 for row in rows if row.closed), 1)
+        session.close()
+
+    def test_ari_update_spec_field_names(self):
+
+        email, room_type_ids = self._create_property(room_types=1)
+        body = self._ari_update(email, [{
+            'ota_room_id': room_type_ids[0], 'start_date': '2030-01-01', 'end_date': '2030-01-03',
+            'units': 5, 'price': '120.00', 'min_los': 1, 'max_los': 14,
+            'closed': False, 'closed_arrival': True, 'closed_departure': False
+        }])
+        self.assertEqual(body['success'], True, body)
+
+        session = Session()
+        row = session.query(Inventory).get((room_type_ids[0], date(2030, 1, 2)))
+        self.assertEqual((row.units, float(row.rate), row.min_los, row.max_los), (5, 120.0, 1, 14))
+        self.assertEqual((row.closed, row.closed_arrival, row.closed_departure), (False, True, False))
+        session.close()
+
+    def test_ari_update_rejects_foreign_room_types(self):
+
+        email, room_type_ids = self._create_property()
+        other_email, other_room_type_ids = self._create_property(room_types=1)
+        body = self._ari_update(email, [{'ota_room_id': other_room_type_ids[0], 'start_date': '2030-01-01',
+                                         'end_date': '2030-01-02', 'units': 1}])
+        self.assertEqual(body['success'], False)
+        self.assertEqual(body['errors'][0]['msg'], 'Unknown room type')
+
+    def test_ari_update_rejects_invalid_ranges(self):
+
+        email, room_type_ids = self._create_property(room_types=1)
+        for entry in ({'start_date': '2030-01-02', 'end_date': '2030-01-01'},
+                      {'start_date': '2030-01-01', 'end_date': '2035-01-01'},
+                      {'start_date': '2030-01-01', 'end_date': '2030-01-01', 'price': 'cheap'},
+                      {'start_date': '01/01/2030', 'end_date': '2030-01-01'}):
+            body = self._ari_update(email, [dict(entry, ota_room_id=room_type_ids[0], units=1)])
+            self.assertEqual(body['success'], False)
+            self.assertEqual(body['errors'][0]['msg'], 'Invalid or missing Api arguments')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import os
+import unittest
+import uuid
+
+import database
+import index
+
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from models import User, RoomType
+
+SHARED_SECRET = 'test123'
+
+os.environ['shared_secret'] = SHARED_SECRET
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+
+        self.password = 'supersecretpassword'
+        self.email = str(uuid.uuid4()) + '@example.com'
+        session = Session()
+        session.add(User(password=self.password, id=self.email))
+        session.add(RoomType(id=str(uuid.uuid4()), user_id=self.email, title='Title', detail='Detail',
+                             dorm=False, occupancy=2))
+        session.commit()
+        session.close()
+
+    def batch(self, requests, password=None):
+        event = {
+            'verb': 'Batch',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': self.email,
+            'ota_property_password': password or self.password,
+            'requests': requests,
+            'shared_secret': SHARED_SECRET
+        }
+        return json.loads(index.router(event, None)['body'])
+
+    def test_read_verbs_authenticate_once(self):
+
+        statements = []
+
+        def record_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        sqlalchemy_event.listen(Engine, 'before_cursor_execute', record_statement)
+        try:
+            body = self.batch([{'verb': 'GetRoomTypes'}, {'verb': 'GetBookingList', 'ota_booking_version': '0'}])
+        finally:
+            sqlalchemy_event.remove(Engine, 'before_cursor_execute', record_statement)
+
+        self.assertEqual(body['success'], True)
+        self.assertEqual([response['success'] for response in body['responses']], [True, True])
+        self.assertEqual(len(body['responses'][0]['Rooms']), 1)
+        self.assertEqual(body['responses'][1]['Bookings'], [])
+        self.assertEqual(len([statement for statement in statements if 'FROM users' in statement]), 1)
+
+    def test_failed_verb_leaves_the_others(self):
+
+        body = self.batch([
+            {'verb': 'SetupProperty'},
+            {'verb': 'ARIUpdate', 'Inventory': [{'ota_room_id': 'unknown', 'start_date': '2018-07-01',
+                                                 'end_date': '2018-07-01', 'units': 1}]},
+            {'verb': 'GetRoomTypes'}
+        ])
+        self.assertEqual(body['success'], True)
+        self.assertEqual([response['success'] for response in body['responses']], [True, False, True])
+        self.assertEqual(body['responses'][1]['errors'], [{'type': 'api', 'msg': 'Unknown room type'}])
+
+        session = Session()
+        self.assertEqual(session.query(User).get(self.email).myallocator_id, 'Test1MyaPropertyID')
+        session.close()
+
+    def test_rejects_bad_batches(self):
+
+        body = self.batch([{'verb': 'GetRoomTypes'}], password='wrong')
+        self.assertEqual(body['errors'], [{'type': 'api', 'msg': 'Invalid or missing authentication arguments'}])
+        self.assertFalse('responses' in body)
+
+        body = self.batch([{'verb': 'Batch', 'requests': []}])
+        self.assertEqual(body['errors'], [{'type': 'api', 'msg': 'Unsupported verb in batch'}])
+
+        body = self.batch('GetRoomTypes')
+        self.assertEqual(body['errors'], [{'type': 'api', 'msg': 'Invalid or missing Api arguments'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+import index
+import uuid
+from datetime import date
+
+from controllers import *
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+import database
+import documents
+import ingest
+import models
+import time
+
+from models import User, Booking, BookingDocument, Customer, BookingRoom
+
+SHARED_SECRET = 'test123'
+
+os.environ['shared_secret'] = SHARED_SECRET
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
+
+
+class TestBookingDocuments(unittest.TestCase):
+
+    password = 'supersecretpassword'
+
+    def setUp(self):
+        os.environ['BOOKING_DOCUMENTS'] = 'true'
+
+    def tearDown(self):
+        del os.environ['BOOKING_DOCUMENTS']
+
+    def _create_booking(self, session, nights=3):
+
+        # Building a new property with a room type, a customer and a booking
+        email = str(uuid.uuid4()) + '@gmail.com'
+        session.add(User(password=self.password, id=email))
+        session.commit()
+        room_type = RoomType(id=str(uuid.uuid4()), user_id=email, title='Title',
+                             detail='Detail', dorm=False, occupancy=1)
+        booking_id = str(uuid.uuid4())
+        customer = Customer(email=booking_id + '@gmail.com', first_name='John', last_name='Doe')
+        booking = Booking(id=booking_id, user_id=email, dttm=datetime.now() + timedelta(hours=-1))
+        booking.customers.append(customer)
+        session.add_all([room_type, customer, booking])
+        session.commit()
+        for count in range(nights):
+            session.add(BookingRoom(dt=date.today() + timedelta(days=30 + count), rate=32.25, rate_id='',
+                                    booking=booking, room_type=room_type))
+        session.commit()
+        return email, booking, room_type
+
+    def _get_booking(self, email, booking_id):
+        return json.loads(index.router({
+            'verb': 'GetBookingId',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': email,
+            'booking_id': booking_id,
+            'ota_property_password': self.password,
+            'shared_secret': SHARED_SECRET
+        }, None)['body'])
+
+    def test_document_served_and_refreshed(self):
+
+        session = Session()
+        email, booking, room_type = self._create_booking(session)
+        self.assertEqual(len(documents.load(session, [booking.id])), 1)
+
+        served = self._get_booking(email, booking.id)
+
+        # Authentication and the document lookup
+        self.assertLessEqual(database.statement_counts('GetBookingId')['last'], 2)
+        del os.environ['BOOKING_DOCUMENTS']
+        try:
+            self.assertEqual(served, self._get_booking(email, booking.id))
+        finally:
+            os.environ['BOOKING_DOCUMENTS'] = 'true'
+
+        # Another night replaces the document
+        session.add(BookingRoom(dt=date.today() + timedelta(days=40), rate=10, rate_id='',
+                                booking=booking, room_type=room_type))
+        session.commit()
+        body = self._get_booking(email, booking.id)
+        self.assertEqual(len(body['Booking']['Rooms'][0]['DayRates']), 4)
+        self.assertEqual(body['Booking']['TotalPrice'], 106.75)
+
+        # As does cancelling the booking
+        booking.cancellation = True
+        session.commit()
+        self.assertEqual(self._get_booking(email, booking.id)['Booking']['IsCancellation'], True)
+        session.close()
+
+    def test_read_miss_stored_through_primary(self):
+
+        session = Session()
+        email, booking, room_type = self._create_booking(session)
+
+        # A night inserted outside the ORM: the trigger drops the document and nothing re-renders it
+        session.execute(BookingRoom.__table__.insert().values(
+            booking_id=booking.id, room_type_id=room_type.id, dt=date.today() + timedelta(days=40),
+            rate=10, rate_id=''))
+        session.commit()
+        self.assertEqual(documents.load(session, [booking.id]), {})
+
+        self.assertEqual(self._get_booking(email, booking.id)['Booking']['TotalPrice'], 106.75)
+        session.expire_all()
+        self.assertEqual(len(documents.load(session, [booking.id])), 1)
+        self.assertNotIn(booking.id, documents.check(session))
+        session.close()
+
+    def test_read_miss_with_single_connection_pool(self):
+
+        # Lambda pool mode without a replica: one pooled connection, shared by the replica role
+        path = os.path.join(os.path.dirname(__file__), 'single-connection-test.db')
+        single = create_engine('sqlite:///' + path, poolclass=QueuePool, pool_size=1, max_overflow=0,
+                               pool_timeout=2)
+        models.Base.metadata.create_all(single)
+        engines, stats = dict(database._engines), dict(database._stats)
+        database.set_engine(database.PRIMARY, single)
+        database._engines[database.REPLICA] = single
+        try:
+            session = Session(bind=single)
+            email, booking, room_type = self._create_booking(session)
+            session.execute(BookingRoom.__table__.insert().values(
+                booking_id=booking.id, room_type_id=room_type.id, dt=date.today() + timedelta(days=40),
+                rate=10, rate_id=''))
+            session.commit()
+            booking_id = booking.id
+            session.close()
+
+            started = time.perf_counter()
+            body = self._get_booking(email, booking_id)
+            self.assertLess(time.perf_counter() - started, 1.0)
+            self.assertEqual(body['Booking']['TotalPrice'], 106.75)
+
+            session = Session(bind=single)
+            self.assertEqual(len(documents.load(session, [booking_id])), 1)
+
+            # Inside a writing Batch the document is stored with the Batch's own writes
+            session.execute(BookingRoom.__table__.delete().where(BookingRoom.dt == date.today() + timedelta(days=40)))
+            session.commit()
+            session.close()
+            body = json.loads(index.router({
+                'verb': 'Batch',
+                'mya_property_id': 'Test1MyaPropertyID',
+                'ota_property_id': email,
+                'ota_property_password': self.password,
+                'shared_secret': SHARED_SECRET,
+                'requests': [{'verb': 'SetupProperty'}, {'verb': 'GetBookingId', 'booking_id': booking_id}]
+            }, None)['body'])
+            self.assertEqual(body['success'], True, body)
+            self.assertEqual(body['responses'][1]['Booking']['TotalPrice'], 96.75)
+
+            session = Session(bind=single)
+            self.assertEqual(len(documents.load(session, [booking_id])), 1)
+            self.assertEqual(session.query(models.User).get(email).myallocator_id, 'Test1MyaPropertyID')
+            session.close()
+        finally:
+            single.dispose()
+            os.remove(path)
+            database._engines.clear()
+            database._engines.update(engines)
+            database._stats.clear()
+            database._stats.update(stats)
+
+    def test_ingested_bookings_materialized(self):
+
+        session = Session()
+        email, booking, room_type = self._create_booking(session)
+        booking_id = str(uuid.uuid4())
+        ingest.ingest(session, [json.dumps({
+            'id': booking_id, 'ota_property_id': email, 'dttm': '2018-06-01T12:00:00',
+            'customers': [{'email': booking_id + '@example.com', 'first_name': 'John', 'last_name': 'Doe'}],
+            'rooms': [{'room_type_id': room_type.id, 'dt': '2018-07-01', 'rate': '120.00'}]
+        })])
+
+        self.assertEqual(len(documents.load(session, [booking_id])), 1)
+        self.assertNotIn(booking_id, documents.check(session))
+        session.close()
+
+    def test_check_and_repair(self):
+
+        session = Session()
+        email, booking, room_type = self._create_booking(session)
+        self.assertNotIn(booking.id, documents.check(session))
+
+        # Corrupting the stored document behind the application's back
+        session.query(BookingDocument).filter(BookingDocument.booking_id == booking.id).\
+            update({BookingDocument.document: '{}'}, synchronize_session=False)
+        session.commit()
+        self.assertIn(booking.id, documents.check(session, repair=True))
+        session.commit()
+        self.assertNotIn(booking.id, documents.check(session))
+        self.assertEqual(self._get_booking(email, booking.id)['Booking']['TotalPrice'], 96.75)
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
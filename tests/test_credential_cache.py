@@ -0,0 +1,70 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import time
+import unittest
+
+from cache import CredentialCache
+
+
+class TestCredentialCache(unittest.TestCase):
+
+    def test_hit_after_add(self):
+
+        cache = CredentialCache(ttl=60, max_size=10)
+        self.assertFalse(cache.is_verified('property', 'password', 'hash1'))
+        cache.add('property', 'password', 'hash1')
+        self.assertTrue(cache.is_verified('property', 'password', 'hash1'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_wrong_password_misses(self):
+
+        cache = CredentialCache(ttl=60, max_size=10)
+        cache.add('property', 'password', 'hash1')
+        self.assertFalse(cache.is_verified('property', 'other', 'hash1'))
+        # A bad attempt must not evict the good entry
+        self.assertTrue(cache.is_verified('property', 'password', 'hash1'))
+
+    def test_changed_hash_invalidates(self):
+
+        cache = CredentialCache(ttl=60, max_size=10)
+        cache.add('property', 'password', 'hash1')
+        self.assertFalse(cache.is_verified('property', 'password', 'hash2'))
+        self.assertFalse(cache.is_verified('property', 'password', 'hash1'))
+
+    def test_expired_entry_misses(self):
+
+        cache = CredentialCache(ttl=0.01, max_size=10)
+        cache.add('property', 'password', 'hash1')
+        time.sleep(0.02)
+        self.assertFalse(cache.is_verified('property', 'password', 'hash1'))
+
+    def test_size_bound_evicts_oldest(self):
+
+        cache = CredentialCache(ttl=60, max_size=2)
+        cache.add('a', 'password', 'hash')
+        cache.add('b', 'password', 'hash')
+        self.assertTrue(cache.is_verified('a', 'password', 'hash'))
+        cache.add('c', 'password', 'hash')
+        self.assertTrue(cache.is_verified('a', 'password', 'hash'))
+        self.assertFalse(cache.is_verified('b', 'password', 'hash'))
+        self.assertTrue(cache.is_verified('c', 'password', 'hash'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+import json
+import os
+import socket
+import time
+
+import database
+import index
+
+from sqlalchemy import create_engine
+
+from controllers import GetRoomTypesDatabaseController, GetBookingListController, GetBookingIdController
+from controllers import SetupPropertyDatabaseController
+
+SHARED_SECRET = 'test123'
+
+os.environ['shared_secret'] = SHARED_SECRET
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+
+class TestDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.database_url = os.environ.get('DB_URL')
+
+    def tearDown(self):
+        os.environ.pop('DB_REPLICA_HOST', None)
+        if self.database_url is not None:
+            os.environ['DB_URL'] = self.database_url
+
+    def test_replica_falls_back_to_primary(self):
+
+        os.environ.pop('DB_REPLICA_HOST', None)
+        self.assertEqual(database.database_host(database.REPLICA), 'localhost')
+        self.assertEqual(database.database_host(database.PRIMARY), 'localhost')
+
+    def test_replica_host(self):
+
+        # URL composition is tested from the DB_* variables alone
+        os.environ.pop('DB_URL', None)
+        os.environ['DB_REPLICA_HOST'] = 'replica.example.com'
+        self.assertEqual(database.database_url(database.REPLICA),
+                         'mysql+mysqlconnector://test:@replica.example.com/test')
+        self.assertEqual(database.database_host(database.PRIMARY), 'localhost')
+
+    def test_replica_role_shares_primary_pool(self):
+
+        engines, stats = dict(database._engines), dict(database._stats)
+        database._engines.clear()
+        database._stats.clear()
+        os.environ['DB_URL'] = 'sqlite:///' + os.path.join(os.path.dirname(__file__), 'shared-pool-test.db')
+        try:
+            self.assertIs(database.get_engine(database.REPLICA), database.get_engine(database.PRIMARY))
+            database.connect_read_only().close()
+            self.assertEqual(database.engine_stats()['replica']['connects'], 1)
+        finally:
+            database.get_engine(database.PRIMARY).dispose()
+            os.remove(os.environ.pop('DB_URL')[len('sqlite:///'):])
+            database._engines.clear()
+            database._engines.update(engines)
+            database._stats.clear()
+            database._stats.update(stats)
+
+    def test_socket_timeouts(self):
+
+        class Socket(object):
+            timeout = None
+
+            def settimeout(self, seconds):
+                self.timeout = seconds
+
+        # mysql-connector-python-rf keeps its socket on the connection's network wrapper
+        connection = type('Connection', (object,), {})()
+        connection._socket = type('MySQLTCPSocket', (object,), {})()
+        connection._socket.sock = Socket()
+        database.set_socket_timeout(connection, 3)
+        self.assertEqual(connection._socket.sock.timeout, 3)
+
+        class OperationalError(Exception):
+            errno = database.CR_SERVER_LOST_EXTENDED
+
+        try:
+            try:
+                raise socket.timeout('timed out')
+            except IOError:
+                raise OperationalError()
+        except OperationalError as error:
+            self.assertTrue(database.is_socket_timeout(error))
+        self.assertFalse(database.is_socket_timeout(OperationalError()))
+
+    def test_verb_routing(self):
+
+        body = {
+            'verb': 'GetBookingId',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': 'property@example.com',
+            'ota_property_password': 'password',
+            'booking_id': 'booking'
+        }
+        self.assertTrue(GetRoomTypesDatabaseController(dict(body, shared_secret=SHARED_SECRET)).read_only)
+        self.assertTrue(GetBookingListController(dict(body, shared_secret=SHARED_SECRET)).read_only)
+        self.assertTrue(GetBookingIdController(dict(body, shared_secret=SHARED_SECRET)).read_only)
+        self.assertFalse(GetBookingIdController(dict(body, shared_secret=SHARED_SECRET, guid='guid')).read_only)
+        self.assertFalse(SetupPropertyDatabaseController(dict(body, shared_secret=SHARED_SECRET)).read_only)
+
+    def test_idle_validation(self):
+
+        engine = create_engine('sqlite://')
+        database.set_engine('idle-test', engine)
+        database.validate_idle_connections(engine, database._stats['idle-test'], 0.05, 0.2)
+
+        # Recently used connections are trusted
+        engine.connect().close()
+        engine.connect().close()
+        stats = database.engine_stats()['idle-test']
+        self.assertEqual((stats['connects'], stats['pings']), (1, 0))
+
+        # Idle ones are pinged
+        time.sleep(0.06)
+        engine.connect().close()
+        stats = database.engine_stats()['idle-test']
+        self.assertEqual((stats['connects'], stats['pings']), (1, 1))
+
+        # Long idle ones are replaced without a ping
+        time.sleep(0.21)
+        connection = engine.connect()
+        connection.execute('SELECT 1')
+        connection.close()
+        stats = database.engine_stats()['idle-test']
+        self.assertEqual((stats['connects'], stats['reconnects'], stats['pings']), (2, 1, 1))
+
+    def test_database_url_override(self):
+
+        os.environ['DB_URL'] = 'sqlite:///local.db'
+        self.assertEqual(database.database_url(database.PRIMARY), 'sqlite:///local.db')
+        self.assertEqual(database.database_url(database.REPLICA), 'sqlite:///local.db')
+        os.environ['DB_REPLICA_URL'] = 'sqlite:///replica.db'
+        try:
+            self.assertEqual(database.database_url(database.REPLICA), 'sqlite:///replica.db')
+        finally:
+            del os.environ['DB_REPLICA_URL']
+            del os.environ['DB_URL']
+
+    def test_statement_trace(self):
+
+        engine = create_engine('sqlite://')
+        database.set_engine('trace-test', engine)
+
+        database.begin_trace('TraceTest')
+        connection = engine.connect()
+        for count in range(4):
+            connection.execute('SELECT ?', ('secret-{0}'.format(count),))
+        connection.close()
+        trace = database.end_trace()
+
+        self.assertEqual(trace.statements, 4)
+        self.assertEqual(len(trace.summary()['slowest']), database.SLOWEST_KEPT)
+        self.assertGreaterEqual(trace.elapsed, trace.slowest[0][0])
+        counts = database.statement_counts('TraceTest')
+        self.assertEqual((counts['last'], counts['max']), (4, 4))
+
+        # Untraced statements do not count towards any verb
+        engine.execute('SELECT 1')
+        self.assertEqual(database.statement_counts('TraceTest')['statements'], 4)
+
+    def test_failed_statements_leave_nothing_on_the_connection(self):
+
+        engine = create_engine('sqlite://')
+        database.set_engine('failure-test', engine)
+        connection = engine.connect()
+        for count in range(3):
+            self.assertRaises(Exception, connection.execute, 'SELECT * FROM missing')
+        connection.execute('SELECT 1')
+        self.assertEqual(database.engine_stats()['failure-test']['checkouts'], 1)
+        self.assertNotIn('query_started', connection.info)
+        connection.close()
+
+    def test_slow_query_log_redacts_parameters(self):
+
+        engine = create_engine('sqlite://')
+        database.set_engine('slow-test', engine)
+        threshold = database.SLOW_QUERY_MS
+        database.SLOW_QUERY_MS = 0
+        try:
+            with self.assertLogs(database.logger, level='WARNING') as logs:
+                engine.execute('SELECT ?, ?', ('hunter2', 42))
+        finally:
+            database.SLOW_QUERY_MS = threshold
+        self.assertIn('Slow query', logs.output[0])
+        self.assertIn('<str>', logs.output[0])
+        self.assertNotIn('hunter2', logs.output[0])
+
+    def test_warmup_event(self):
+
+        result = index.router({'warmup': True}, None)
+
+        self.assertEqual(result['statusCode'], 200)
+        body = json.loads(result['body'])
+        self.assertEqual(body['success'], True)
+        for phase in ['imports', 'mappers', 'primary_engine', 'primary_connect', 'replica_engine', 'replica_connect']:
+            self.assertGreaterEqual(body['timings'][phase], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
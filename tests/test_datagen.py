@@ -0,0 +1,51 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from benchmarks.datagen import Generator
+
+
+class TestDatagen(unittest.TestCase):
+
+    def _rows(self, seed, namespace):
+        rows, generated = Generator(seed, namespace).property_rows(0, room_types=3, bookings=20,
+                                                                  max_nights=5, max_customers=2)
+        # bcrypt salts differ on every run
+        del rows['users']
+        return rows, generated
+
+    def test_seeded_data_is_repeatable(self):
+
+        rows, generated = self._rows(7, 'first')
+        self.assertEqual(rows, self._rows(7, 'first')[0])
+        self.assertEqual(len(generated.booking_ids), 20)
+        self.assertEqual(len(generated.room_type_ids), 3)
+        self.assertGreaterEqual(len(rows['booking_rooms']), 20)
+
+    def test_namespace_only_changes_keys(self):
+
+        rows, generated = self._rows(7, 'first')
+        other_rows, other = self._rows(7, 'second')
+        self.assertFalse(set(generated.booking_ids) & set(other.booking_ids))
+        self.assertEqual([row['rate'] for row in rows['booking_rooms']],
+                         [row['rate'] for row in other_rows['booking_rooms']])
+
+
+if __name__ == '__main__':
+    unittest.main()
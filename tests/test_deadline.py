@@ -0,0 +1,170 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import os
+import unittest
+import uuid
+
+from datetime import datetime
+
+import database
+import index
+
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from controllers import GetBookingListController
+from models import User, Booking
+
+SHARED_SECRET = 'test123'
+
+os.environ['shared_secret'] = SHARED_SECRET
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
+
+
+class FakeContext(object):
+    """Lambda context whose remaining time runs out after the given number of queries of a table."""
+
+    def __init__(self, queries, table='bookings'):
+        self.queries = queries
+        self.table = table
+
+    def get_remaining_time_in_millis(self):
+        return 10000 if self.queries > 0 else 100
+
+
+def counting_queries(context):
+    """Engine listener spending the context's queries."""
+
+    def count_query(conn, cursor, statement, parameters, context_, executemany):
+        if context is not None and 'FROM ' + context.table in statement:
+            context.queries = context.queries - 1
+    return count_query
+
+
+class TestDeadline(unittest.TestCase):
+
+    def setUp(self):
+
+        self.password = 'supersecretpassword'
+        self.email = str(uuid.uuid4()) + '@example.com'
+        session = Session()
+        session.add(User(password=self.password, id=self.email))
+        session.commit()
+        for count in range(5):
+            session.add(Booking(id=str(uuid.uuid4()), user_id=self.email, dttm=datetime.now()))
+            session.commit()
+        session.close()
+
+    def get_booking_list(self, context, cursor=None):
+        event = {
+            'verb': 'GetBookingList',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': self.email,
+            'ota_booking_version': '0',
+            'ota_property_password': self.password,
+            'shared_secret': SHARED_SECRET
+        }
+        if cursor is not None:
+            event['ota_booking_cursor'] = cursor
+        return self.route(event, context)
+
+    def route(self, event, context):
+        count_query = counting_queries(context)
+        sqlalchemy_event.listen(Engine, 'after_cursor_execute', count_query)
+        try:
+            return json.loads(index.router(event, context)['body'])
+        finally:
+            sqlalchemy_event.remove(Engine, 'after_cursor_execute', count_query)
+
+    def test_spent_budget_returns_error(self):
+
+        body = self.get_booking_list(FakeContext(0))
+        self.assertEqual(body['success'], False)
+        self.assertEqual(body['errors'], [{'type': 'api', 'msg': 'Request timed out'}])
+
+    def test_spent_budget_at_commit_rolls_back(self):
+
+        # Authentication and SetupProperty's own read run; the UPDATE at commit does not
+        body = self.route({
+            'verb': 'SetupProperty',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': self.email,
+            'ota_property_password': self.password,
+            'shared_secret': SHARED_SECRET
+        }, FakeContext(2, table='users'))
+        self.assertEqual(body['success'], False)
+        self.assertEqual(body['errors'], [{'type': 'api', 'msg': 'Request timed out'}])
+
+        session = Session()
+        self.assertIsNone(session.query(User).get(self.email).myallocator_id)
+        session.close()
+
+    def test_spent_budget_in_batch_rolls_back(self):
+
+        body = self.route({
+            'verb': 'Batch',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': self.email,
+            'ota_property_password': self.password,
+            'shared_secret': SHARED_SECRET,
+            'requests': [{'verb': 'SetupProperty'}]
+        }, FakeContext(2, table='users'))
+        self.assertEqual(body['success'], False)
+        self.assertEqual(body['errors'], [{'type': 'api', 'msg': 'Request timed out'}])
+
+        session = Session()
+        self.assertIsNone(session.query(User).get(self.email).myallocator_id)
+        session.close()
+
+    def test_partial_booking_list_resumes_with_cursor(self):
+
+        fetch_size = GetBookingListController.fetch_size
+        GetBookingListController.fetch_size = 2
+        try:
+            # The budget runs out once the booking query has run, before the rows after the first fetch
+            body = self.get_booking_list(FakeContext(1))
+            self.assertEqual(body['success'], True)
+            self.assertEqual([booking['version'] for booking in body['Bookings']], ['1', '2'])
+
+            # The rest arrives on the next call
+            body = self.get_booking_list(FakeContext(10), body['ota_booking_cursor'])
+            self.assertEqual(body['success'], True)
+            self.assertEqual([booking['version'] for booking in body['Bookings']], ['3', '4', '5'])
+            self.assertFalse('ota_booking_cursor' in body)
+            self.assertEqual(database.statement_counts('GetBookingList')['last'], 2)
+        finally:
+            GetBookingListController.fetch_size = fetch_size
+
+    def test_no_context_means_no_deadline(self):
+
+        body = self.get_booking_list(None)
+        self.assertEqual(body['success'], True)
+        self.assertEqual(len(body['Bookings']), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+import json
+
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import encoder
+
+from encoder import RawJSON
+
+
+class TestEncoder(unittest.TestCase):
+
+    def test_backends(self):
+
+        data = {
+            'Price': Decimal('96.75'),
+            'Rates': [Decimal('0.10'), Decimal('32.25'), Decimal('1E+2')],
+            'StartDate': date(2018, 2, 1),
+            'OrderTime': time(10, 5, 0),
+            'Created': datetime(2018, 1, 1, 10, 5, 0),
+            'Booking': RawJSON('{"OrderId":"b1"}'),
+            'Text': 'quote " and \x00 survive',
+            'Units': 1
+        }
+        for name, dumps in encoder.BACKENDS.items():
+            text = dumps(data)
+            self.assertIn('"Price":96.75', text, name)
+            self.assertIn('"Rates":[0.1,32.25,1E+2]', text, name)
+            self.assertIn('"Booking":{"OrderId":"b1"}', text, name)
+            decoded = json.loads(text, parse_float=Decimal)
+            self.assertEqual(decoded['Rates'], [Decimal('0.10'), Decimal('32.25'), Decimal('100')], name)
+            self.assertEqual(decoded['StartDate'], '2018-02-01', name)
+            self.assertEqual(decoded['OrderTime'], '10:05:00', name)
+            self.assertEqual(decoded['Created'], '2018-01-01T10:05:00', name)
+            self.assertEqual(decoded['Text'], data['Text'], name)
+            self.assertEqual(decoded['Units'], 1, name)
+
+    def test_long_decimals_are_exact(self):
+
+        for name, dumps in encoder.BACKENDS.items():
+            text = dumps({'Rate': Decimal('1234567890123.4567891')})
+            self.assertEqual(text, '{"Rate":1234567890123.4567891}', name)
+
+    def test_backends_agree(self):
+
+        data = {'Rates': [Decimal('100.00'), Decimal('32.50'), Decimal('32.25'), Decimal('-0.00'), Decimal('7'),
+                          Decimal('0.00001'), Decimal('9999999999999.99')]}
+        texts = set(dumps(data) for dumps in encoder.BACKENDS.values())
+        self.assertEqual(texts, {'{"Rates":[100.0,32.5,32.25,-0.0,7.0,0.00001,9999999999999.99]}'})
+
+    def test_rejects_unencodable_values(self):
+
+        for name, dumps in encoder.BACKENDS.items():
+            self.assertRaises((TypeError, ValueError), dumps, {'value': Decimal('NaN')})
+            self.assertRaises(TypeError, dumps, {'value': object()})
+
+
+if __name__ == '__main__':
+    unittest.main()
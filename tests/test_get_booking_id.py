@@ -17,13 +17,13 @@
 # limitations under the License.
 #
 import unittest
+import database
 import index
 import uuid
 from datetime import date
 
 from controllers import *
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from models import User, Booking, Customer, BookingRoom
@@ -36,15 +36,59 @@ os.environ['DB_PASS'] = ''
 os.environ['DB_HOST'] = 'localhost'
 os.environ['DB_NAME'] = 'test'
 
-mysql = create_engine('mysql+mysqlconnector://' + os.environ['DB_USER'] + ':' +
-                      os.environ['DB_PASS'] + '@' + os.environ['DB_HOST'] + '/' +
-                      os.environ['DB_NAME'], isolation_level='READ COMMITTED',
-                      pool_pre_ping=True)
-Session = sessionmaker(bind=mysql)
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
 
 
 class TestGetBookingId(unittest.TestCase):
 
+    def _create_booking(self, password, nights=3):
+
+        # Building a new property with a room type and a booking with two customers
+        email = str(uuid.uuid4()) + '@gmail.com'
+        session = Session()
+        new_user = User(password=password, id=email)
+        session.add(new_user)
+        session.commit()
+        new_room_type = RoomType(id=str(uuid.uuid4()), user_id=email, title='Title',
+                                 detail='Detail', dorm=False, occupancy=1)
+        booking_id = str(uuid.uuid4())
+        new_customer = Customer(email=booking_id + '@gmail.com', first_name='John', last_name='Doe')
+        new_booking = Booking(id=booking_id, user_id=email, dttm=datetime.now() + timedelta(hours=-1))
+        new_booking.customers.append(new_customer)
+        new_booking.customers.append(Customer(email=booking_id + '@example.com', first_name='Jane', last_name='Doe'))
+        session.add_all([new_room_type, new_customer, new_booking])
+        session.commit()
+        for count in range(nights):
+            session.add(BookingRoom(dt=date.today() + timedelta(days=30 + count), rate=32.25, rate_id='',
+                                    booking=new_booking, room_type=new_room_type))
+        session.commit()
+        return email, booking_id
+
+    def test_get_booking_statement_budget(self):
+
+        password = 'supersecretpassword'
+        email, booking_id = self._create_booking(password, nights=5)
+        # Run the transaction
+        event = {
+            'verb': 'GetBookingId',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': email,
+            'booking_id': booking_id,
+            "ota_property_password": password,
+            'shared_secret': SHARED_SECRET
+        }
+        result = index.router(event, None)
+
+        body = json.loads(result['body'])
+        self.assertEqual(body['success'], True)
+        self.assertEqual(len(body['Booking']['Customers']), 2)
+        self.assertEqual(len(body['Booking']['Rooms'][0]['DayRates']), 5)
+        self.assertEqual(body['Booking']['TotalPrice'], 161.25)
+
+        # One statement to authenticate, one for the booking with its customers and day rates
+        self.assertLessEqual(database.statement_counts('GetBookingId')['last'], 2)
+
     def test_get_booking_happy_path(self):
 
         # Building a new property to store
@@ -0,0 +1,127 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+import database
+import index
+import uuid
+from datetime import date
+
+from controllers import *
+
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from models import User, Booking, Customer, BookingRoom
+
+SHARED_SECRET = 'test123'
+
+os.environ['shared_secret'] = SHARED_SECRET
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
+
+
+class TestGetBookingIds(unittest.TestCase):
+
+    def test_get_booking_ids_happy_path(self):
+
+        # Building a new property with a room type
+        password = 'supersecretpassword'
+        email = str(uuid.uuid4()) + '@gmail.com'
+        session = Session()
+        session.add(User(password=password, id=email))
+        session.commit()
+        new_room_type = RoomType(id=str(uuid.uuid4()), user_id=email, title='Title',
+                                 detail='Detail', dorm=False, occupancy=1)
+        session.add(new_room_type)
+        session.commit()
+
+        # Storing three bookings with one customer and a growing number of nights
+        booking_ids = []
+        for count in range(1, 4):
+            booking_id = str(uuid.uuid4())
+            new_customer = Customer(email=booking_id + '@gmail.com', first_name='John', last_name='Doe')
+            new_booking = Booking(id=booking_id, user_id=email, dttm=datetime.now() + timedelta(hours=-1))
+            new_booking.customers.append(new_customer)
+            session.add_all([new_customer, new_booking])
+            for night in range(count):
+                session.add(BookingRoom(dt=date.today() + timedelta(days=30 + night), rate=32.25, rate_id='',
+                                        booking=new_booking, room_type=new_room_type))
+            session.commit()
+            booking_ids.append(booking_id)
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        # Run the transaction with an unknown id in the middle
+        event = {
+            'verb': 'GetBookingIds',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': email,
+            'booking_ids': booking_ids[:1] + ['unknown'] + booking_ids[1:],
+            "ota_property_password": password,
+            'shared_secret': SHARED_SECRET
+        }
+        sqlalchemy_event.listen(Engine, 'before_cursor_execute', count_statement)
+        try:
+            result = index.router(event, None)
+        finally:
+            sqlalchemy_event.remove(Engine, 'before_cursor_execute', count_statement)
+
+        # Validate the API call
+        self.assertEqual(result['statusCode'], 200)
+        body = json.loads(result['body'])
+        self.assertFalse('errors' in body)
+        self.assertEqual(body['success'], True)
+        self.assertEqual([entry['booking_id'] for entry in body['Bookings']], event['booking_ids'])
+        self.assertEqual(body['Bookings'][1]['success'], False)
+        self.assertEqual(len(body['Bookings'][1]['errors']), 1)
+        for nights, entry in zip([1, 2, 3], body['Bookings'][:1] + body['Bookings'][2:]):
+            self.assertEqual(entry['success'], True)
+            self.assertEqual(len(entry['Booking']['Customers']), 1)
+            self.assertEqual(len(entry['Booking']['Rooms'][0]['DayRates']), nights)
+            self.assertEqual(entry['Booking']['TotalPrice'], 32.25 * nights)
+
+        # Authentication, bookings with customers and day rates, whatever the batch size
+        self.assertLessEqual(len(statements), 3, statements)
+
+    def test_get_booking_ids_rejects_oversized_batch(self):
+
+        event = {
+            'verb': 'GetBookingIds',
+            'mya_property_id': 'Test1MyaPropertyID',
+            'ota_property_id': 'nobody@example.com',
+            'booking_ids': [str(count) for count in range(GetBookingIdsController.max_batch_size + 1)],
+            "ota_property_password": 'password',
+            'shared_secret': SHARED_SECRET
+        }
+        body = json.loads(index.router(event, None)['body'])
+        self.assertEqual(body['success'], False)
+        self.assertEqual(len(body['errors']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,12 +17,12 @@
 # limitations under the License.
 #
 import unittest
+import database
 import index
 import uuid
 
 from controllers import *
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from models import User
@@ -36,11 +36,8 @@ os.environ['DB_PASS'] = ''
 os.environ['DB_HOST'] = 'localhost'
 os.environ['DB_NAME'] = 'test'
 
-mysql = create_engine('mysql+mysqlconnector://' + os.environ['DB_USER'] + ':' +
-                      os.environ['DB_PASS'] + '@' + os.environ['DB_HOST'] + '/' +
-                      os.environ['DB_NAME'], echo=True, isolation_level='READ COMMITTED',
-                      pool_pre_ping=True)
-Session = sessionmaker(bind=mysql)
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
 
 
 class TestGetBookingList(unittest.TestCase):
@@ -97,6 +94,103 @@ class TestGetBookingList(unittest.TestCase):
         self.assertEqual(body['success'], True)
         self.assertEqual(len(body['Bookings']), 2)
 
+    def test_get_list_returns_exact_delta(self):
+
+        # Building a new property to store
+        password = 'supersecretpassword'
+        email = str(uuid.uuid4()) + '@gmail.com'
+        new_user = User(password=password, id=email)
+        session = Session()
+        session.add(new_user)
+        session.commit()
+
+        # Storing a few bookings for this test
+        booking_ids = [str(uuid.uuid4()) for count in range(3)]
+        for booking_id in booking_ids:
+            session.add(Booking(id=booking_id, user_id=new_user.id, dttm=datetime.now()))
+        session.commit()
+
+        def poll(version):
+            event = {
+                'verb': 'GetBookingList',
+                'mya_property_id': 'Test1MyaPropertyID',
+                'ota_property_id': email,
+                'ota_booking_version': version,
+                "ota_property_password": password,
+                'shared_secret': SHARED_SECRET
+            }
+            body = json.loads(index.router(event, None)['body'])
+            self.assertEqual(body['success'], True)
+            return body['Bookings']
+
+        bookings = poll(None)
+        self.assertEqual([booking['booking_id'] for booking in bookings], booking_ids)
+        version = bookings[-1]['version']
+
+        # Nothing changed since the last version
+        self.assertEqual(len(poll(version)), 0)
+
+        # A cancellation and a new booking are the only changes returned
+        cancelled = session.query(Booking).get(booking_ids[0])
+        cancelled.cancellation = True
+        new_booking_id = str(uuid.uuid4())
+        session.add(Booking(id=new_booking_id, user_id=new_user.id, dttm=datetime.now()))
+        session.commit()
+        bookings = poll(version)
+        self.assertEqual(sorted([booking['booking_id'] for booking in bookings]),
+                         sorted([booking_ids[0], new_booking_id]))
+        self.assertEqual(len(poll(bookings[-1]['version'])), 0)
+
+    def test_get_list_pages_with_cursor(self):
+
+        # Building a new property to store
+        password = 'supersecretpassword'
+        email = str(uuid.uuid4()) + '@gmail.com'
+        new_user = User(password=password, id=email)
+        session = Session()
+        session.add(new_user)
+        session.commit()
+
+        # Storing five bookings, two sharing the same timestamp
+        dttm = datetime.now().replace(microsecond=0) + timedelta(hours=-1)
+        for count in range(5):
+            session.add(Booking(id=str(uuid.uuid4()), user_id=new_user.id,
+                                dttm=dttm + timedelta(minutes=min(count, 3))))
+        session.commit()
+
+        # Walk the pages two at a time
+        page_size = GetBookingListController.page_size
+        GetBookingListController.page_size = 2
+        try:
+            seen = []
+            cursor = None
+            pages = 0
+            while True:
+                event = {
+                    'verb': 'GetBookingList',
+                    'mya_property_id': 'Test1MyaPropertyID',
+                    'ota_property_id': email,
+                    'ota_booking_version': None,
+                    "ota_property_password": password,
+                    'shared_secret': SHARED_SECRET
+                }
+                if cursor is not None:
+                    event['ota_booking_cursor'] = cursor
+                body = json.loads(index.router(event, None)['body'])
+                self.assertEqual(body['success'], True)
+                self.assertLessEqual(len(body['Bookings']), 2)
+                seen.extend([booking['booking_id'] for booking in body['Bookings']])
+                pages = pages + 1
+                cursor = body.get('ota_booking_cursor')
+                if cursor is None:
+                    break
+        finally:
+            GetBookingListController.page_size = page_size
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
     def test_get_list_null_no_listings(self):
 
         # Building a new property to store
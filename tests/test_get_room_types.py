@@ -17,12 +17,14 @@
 # limitations under the License.
 #
 import unittest
+import database
 import index
 import uuid
 
 from controllers import *
 
-from sqlalchemy import create_engine
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
 from models import User
@@ -35,11 +37,8 @@ os.environ['DB_PASS'] = ''
 os.environ['DB_HOST'] = 'localhost'
 os.environ['DB_NAME'] = 'test'
 
-mysql = create_engine('mysql+mysqlconnector://' + os.environ['DB_USER'] + ':' +
-                      os.environ['DB_PASS'] + '@' + os.environ['DB_HOST'] + '/' +
-                      os.environ['DB_NAME'], isolation_level='READ COMMITTED',
-                      pool_pre_ping=True)
-Session = sessionmaker(bind=mysql)
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
 
 
 class TestGetRoomTypes(unittest.TestCase):
@@ -85,6 +84,42 @@ class TestGetRoomTypes(unittest.TestCase):
         self.assertEqual(body['success'], True)
         self.assertEqual(len(body['Rooms']), 3)
 
+    def test_get_room_types_skips_transaction(self):
+
+        # Building a new property to store
+        password = 'supersecretpassword'
+        email = str(uuid.uuid4()) + '@example.com'
+        session = Session()
+        session.add(User(password=password, id=email))
+        session.commit()
+
+        event = {
+            "verb": "GetRoomTypes",
+            "mya_property_id": "Test1MyaPropertyID",
+            "ota_property_id": email,
+            "ota_property_password": password,
+            "shared_secret": SHARED_SECRET
+        }
+
+        # Read verbs should never send COMMIT or ROLLBACK
+        transactions = []
+
+        def count_transaction(conn):
+            transactions.append(conn)
+
+        sqlalchemy_event.listen(Engine, 'commit', count_transaction)
+        sqlalchemy_event.listen(Engine, 'rollback', count_transaction)
+        try:
+            result = index.router(event, None)
+        finally:
+            sqlalchemy_event.remove(Engine, 'commit', count_transaction)
+            sqlalchemy_event.remove(Engine, 'rollback', count_transaction)
+
+        body = json.loads(result['body'])
+        self.assertEqual(body['success'], True)
+        self.assertEqual(len(body['Rooms']), 0)
+        self.assertEqual(len(transactions), 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,73 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+import os
+
+import database
+import migrate
+
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+engine = database.get_engine(database.PRIMARY)
+
+
+@unittest.skipUnless(engine.dialect.name == 'mysql', 'query plans are MySQL specific')
+class TestIndexes(unittest.TestCase):
+
+    def explain(self, statement, parameters):
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute('EXPLAIN ' + statement, parameters)
+            return dict((row['table'], row) for row in cursor.fetchall())
+        finally:
+            connection.close()
+
+    def test_migrations_applied(self):
+
+        self.assertEqual(migrate.migrate(engine, status_only=True), [])
+
+    def test_booking_list_by_sequence(self):
+
+        plan = self.explain('SELECT id, seq FROM bookings WHERE myallocator_guid IS NULL AND user_id = %s '
+                            'AND seq > %s ORDER BY seq LIMIT 501', ('property@example.com', 10))
+        self.assertNotEqual(plan['bookings']['type'], 'ALL')
+        self.assertEqual(plan['bookings']['key'], 'bookings_poll')
+
+    def test_booking_list_by_timestamp(self):
+
+        plan = self.explain('SELECT id, seq FROM bookings WHERE myallocator_guid IS NULL AND user_id = %s '
+                            'AND dttm >= %s ORDER BY seq LIMIT 501', ('property@example.com', '2018-01-01 00:00:00'))
+        self.assertNotEqual(plan['bookings']['type'], 'ALL')
+        self.assertEqual(plan['bookings']['key'], 'bookings_poll')
+
+    def test_room_types(self):
+
+        plan = self.explain('SELECT room_types.id, room_types.title, room_types.detail, room_types.occupancy, '
+                            'room_types.dorm FROM room_types INNER JOIN users ON users.id = room_types.user_id '
+                            'WHERE users.id = %s', ('property@example.com',))
+        for table in plan.values():
+            self.assertNotEqual(table['type'], 'ALL', table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import os
+import unittest
+import uuid
+
+import database
+
+from decimal import Decimal
+
+from sqlalchemy.orm import sessionmaker
+
+from ingest import ingest
+from models import User, RoomType, Booking, BookingRoom, Customer
+
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
+
+
+class TestIngest(unittest.TestCase):
+
+    def test_ingest_in_chunks_and_resume(self):
+
+        email = str(uuid.uuid4()) + '@example.com'
+        room_type_id = str(uuid.uuid4())
+        session = Session()
+        session.add(User(password='supersecretpassword', id=email))
+        session.add(RoomType(id=room_type_id, user_id=email, title='Title', detail='', dorm=False, occupancy=2))
+        session.commit()
+
+        shared_email = str(uuid.uuid4()) + '@example.com'
+        booking_ids = [str(uuid.uuid4()) for count in range(3)]
+        lines = [json.dumps({
+            'id': booking_id, 'ota_property_id': email, 'dttm': '2018-06-0{0}T12:00:00'.format(count + 1),
+            'customers': [{'email': shared_email, 'first_name': 'Name {0}'.format(count), 'last_name': 'Doe'},
+                          {'email': booking_id + '@example.com', 'country': 'DE'}],
+            'rooms': [{'room_type_id': room_type_id, 'dt': '2018-07-{0:02d}'.format(night + 1), 'rate': '32.25'}
+                      for night in range(count + 1)]
+        }) for count, booking_id in enumerate(booking_ids)]
+
+        self.assertEqual(ingest(session, lines[:2] + ['\n'], chunk_size=2), (2, 2, 3))
+        # Running again over the whole file only adds what is missing
+        self.assertEqual(ingest(session, lines, chunk_size=2), (3, 1, 3))
+
+        bookings = session.query(Booking).filter(Booking.user_id == email).order_by(Booking.seq).all()
+        self.assertEqual([booking.id for booking in bookings], booking_ids)
+        self.assertEqual([booking.seq for booking in bookings], [1, 2, 3])
+        self.assertEqual([len(booking.customers) for booking in bookings], [2, 2, 2])
+        self.assertEqual(session.query(Customer).get(shared_email).first_name, 'Name 2')
+        unnamed = session.query(Customer).get(booking_ids[0] + '@example.com')
+        self.assertEqual((unnamed.country, unnamed.first_name, unnamed.last_name), ('DE', '', ''))
+        rates = [rate for rate, in session.query(BookingRoom.rate).filter(BookingRoom.booking_id.in_(booking_ids))]
+        self.assertEqual(len(rates), 6)
+        self.assertTrue(all(rate == Decimal('32.25') for rate in rates))
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
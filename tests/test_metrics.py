@@ -0,0 +1,86 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+import io
+import json
+import os
+
+from contextlib import redirect_stdout
+
+import index
+import metrics
+
+SHARED_SECRET = 'test123'
+
+os.environ['shared_secret'] = SHARED_SECRET
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        os.environ['METRICS'] = 'true'
+
+    def tearDown(self):
+        del os.environ['METRICS']
+
+    def _health_check(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            index.router({'body': json.dumps({
+                'verb': 'HealthCheck',
+                'mya_property_id': 'Test1MyaPropertyID',
+                'ota_property_id': 'Test1OtaPropertyID',
+                'shared_secret': SHARED_SECRET
+            })}, None)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        return json.loads(lines[0])
+
+    def test_embedded_metric_format(self):
+
+        document = self._health_check()
+        directive = document['_aws']['CloudWatchMetrics'][0]
+        self.assertIsInstance(document['_aws']['Timestamp'], int)
+        self.assertEqual(directive['Namespace'], metrics.NAMESPACE)
+        self.assertEqual(directive['Dimensions'], [['Verb', 'Start']])
+        self.assertEqual(document['Verb'], 'HealthCheck')
+        self.assertIn(document['Start'], ('cold', 'warm'))
+
+        # Every declared metric is a top level number, and the phases of handle() are all there
+        names = [metric['Name'] for metric in directive['Metrics']]
+        for metric in directive['Metrics']:
+            self.assertIn(metric['Unit'], ('Milliseconds', 'Count'))
+            self.assertIsInstance(document[metric['Name']], (int, float))
+        for phase in ('parse', 'validate', 'action', 'serialize', 'total'):
+            self.assertIn(phase, names)
+
+        # Only the first invocation of a container is the cold start
+        self.assertEqual(self._health_check()['Start'], 'warm')
+
+    def test_timers_are_noops_outside_an_invocation(self):
+
+        with metrics.timed('validate'):
+            pass
+        metrics.record('queries', 1, metrics.COUNT)
+        self.assertIsNone(metrics.current)
+        self.assertIsNone(metrics.finish())
+
+
+if __name__ == '__main__':
+    unittest.main()
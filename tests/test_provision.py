@@ -0,0 +1,82 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import io
+import json
+import os
+import unittest
+import uuid
+
+import database
+
+from sqlalchemy.orm import sessionmaker
+
+from models import User, RoomType
+from provision import provision, read_csv, read_ndjson
+
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
+
+
+class TestProvision(unittest.TestCase):
+
+    def test_ndjson_with_worker_pool(self):
+
+        prefix = str(uuid.uuid4())
+        lines = [json.dumps({'id': '{0}-{1}@example.com'.format(prefix, count), 'password': 'password{0}'.format(count),
+                             'myallocator_id': 'mya{0}'.format(count),
+                             'room_types': [{'id': '{0}-{1}-{2}'.format(prefix, count, room), 'title': 'Room',
+                                             'occupancy': 2, 'dorm': room == 1} for room in range(count)]})
+                 for count in range(3)]
+
+        session = Session()
+        self.assertEqual(provision(session, read_ndjson(lines + ['']), workers=2, chunk_size=2), (3, 3))
+
+        users = session.query(User).filter(User.id.like(prefix + '%')).order_by(User.id).all()
+        self.assertEqual([user.myallocator_id for user in users], ['mya0', 'mya1', 'mya2'])
+        self.assertTrue(all(user.validate_pw('password{0}'.format(count)) for count, user in enumerate(users)))
+        self.assertEqual([user.room_type_version for user in users], [0, 1, 2])
+        dorms = session.query(RoomType.dorm).filter(RoomType.user_id == users[2].id).order_by(RoomType.id).all()
+        self.assertEqual([dorm for dorm, in dorms], [False, True])
+        session.close()
+
+    def test_csv_groups_room_types_by_property(self):
+
+        prefix = str(uuid.uuid4())
+        text = 'property_id,password,myallocator_id,room_type_id,title,detail,occupancy,dorm\n' + \
+               '{0}-a,secret,,{0}-a1,Double,Sea view,2,false\n'.format(prefix) + \
+               '{0}-a,secret,,{0}-a2,Dorm,,8,true\n'.format(prefix) + \
+               '{0}-b,other,mya-b,,,,,\n'.format(prefix)
+
+        session = Session()
+        self.assertEqual(provision(session, read_csv(io.StringIO(text))), (2, 2))
+        user = session.query(User).get(prefix + '-b')
+        self.assertEqual(user.myallocator_id, 'mya-b')
+        self.assertTrue(user.validate_pw('other'))
+        room_type = session.query(RoomType).get(prefix + '-a2')
+        self.assertEqual((room_type.occupancy, room_type.dorm, room_type.detail), (8, True, ''))
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
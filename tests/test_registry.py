@@ -0,0 +1,57 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+import os
+import subprocess
+import sys
+
+import registry
+
+from base import BaseController
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_unknown_verbs_use_base_controller(self):
+
+        self.assertIs(registry.controller_for('HealthCheck'), BaseController)
+        self.assertIs(registry.controller_for(None), BaseController)
+        self.assertIs(registry.controller_for(['GetRoomTypes']), BaseController)
+
+    def test_database_verbs_resolve(self):
+
+        for verb in registry.VERB_MODULES:
+            controller = registry.controller_for(verb)
+            self.assertIsNot(controller, BaseController)
+            self.assertEqual(controller.__module__, registry.VERB_MODULES[verb])
+
+    def test_health_check_does_not_load_database_modules(self):
+
+        code = ('import os, sys; os.environ["shared_secret"] = "x"; import index; '
+                'index.router({"verb": "HealthCheck", "mya_property_id": "", "ota_property_id": "", '
+                '"shared_secret": "x"}, None); '
+                'print(",".join(m for m in ("sqlalchemy", "bcrypt", "controllers") if m in sys.modules))')
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                         universal_newlines=True)
+        self.assertEqual(output.strip(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
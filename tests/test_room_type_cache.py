@@ -0,0 +1,144 @@
+#
+# Copyright 2018 Stephen Cuppett
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+
+import database
+import index
+
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from cache import FileTier, MemoryTier, RoomTypeCache, room_type_cache, shared_tier
+from models import User, RoomType
+
+SHARED_SECRET = 'test123'
+
+os.environ['shared_secret'] = SHARED_SECRET
+os.environ['DB_USER'] = 'test'
+os.environ['DB_PASS'] = ''
+os.environ['DB_HOST'] = 'localhost'
+os.environ['DB_NAME'] = 'test'
+
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
+
+ROOMS = [{'ota_room_id': 'r1', 'title': 'Title', 'detail': None, 'occupancy': 2, 'dorm': False}]
+
+
+class TestRoomTypeCache(unittest.TestCase):
+
+    def test_hit_only_for_same_version(self):
+
+        cache = RoomTypeCache(max_size=10)
+        self.assertIsNone(cache.get('property', 1))
+        cache.add('property', 1, ROOMS)
+        self.assertEqual(cache.get('property', 1), ROOMS)
+        self.assertIsNone(cache.get('property', 2))
+        self.assertEqual(cache.stats(), {'hits': 1, 'shared_hits': 0, 'misses': 2, 'size': 1})
+
+    def test_size_bound_evicts_oldest(self):
+
+        cache = RoomTypeCache(max_size=1)
+        cache.add('a', 1, ROOMS)
+        cache.add('b', 1, ROOMS)
+        self.assertIsNone(cache.get('a', 1))
+        self.assertEqual(cache.get('b', 1), ROOMS)
+
+    def test_shared_tiers(self):
+
+        directory = tempfile.mkdtemp()
+        try:
+            for shared in [MemoryTier(), FileTier(directory), shared_tier('file:' + directory)]:
+                # A second container sees the first one's catalogue through the shared tier
+                RoomTypeCache(max_size=10, shared=shared).add('property', 3, ROOMS)
+                other = RoomTypeCache(max_size=10, shared=shared)
+                self.assertIsNone(other.get('property', 4))
+                self.assertEqual(other.get('property', 3), ROOMS)
+                self.assertEqual(other.get('property', 3), ROOMS)
+                self.assertEqual(other.stats(), {'hits': 1, 'shared_hits': 1, 'misses': 1, 'size': 1})
+        finally:
+            shutil.rmtree(directory)
+
+    def test_room_type_write_invalidates(self):
+
+        password = 'supersecretpassword'
+        email = str(uuid.uuid4()) + '@example.com'
+        session = Session()
+        session.add(User(password=password, id=email))
+        session.add(RoomType(id=str(uuid.uuid4()), user_id=email, title='Title 1', detail='Detail 1',
+                             dorm=False, occupancy=1))
+        session.commit()
+
+        event = {
+            "verb": "GetRoomTypes",
+            "mya_property_id": "Test1MyaPropertyID",
+            "ota_property_id": email,
+            "ota_property_password": password,
+            "shared_secret": SHARED_SECRET
+        }
+
+        statements = []
+
+        def record_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        def room_type_queries(event):
+            del statements[:]
+            sqlalchemy_event.listen(Engine, 'before_cursor_execute', record_statement)
+            try:
+                body = json.loads(index.router(dict(event), None)['body'])
+            finally:
+                sqlalchemy_event.remove(Engine, 'before_cursor_execute', record_statement)
+            self.assertEqual(body['success'], True)
+            return body['Rooms'], len([statement for statement in statements if 'FROM room_types' in statement])
+
+        rooms, queries = room_type_queries(event)
+        self.assertEqual((len(rooms), queries), (1, 1))
+        rooms, queries = room_type_queries(event)
+        self.assertEqual((len(rooms), queries), (1, 0))
+
+        # Adding, changing and removing a room type each change the catalogue version
+        room_type = RoomType(id=str(uuid.uuid4()), user_id=email, title='Title 2', detail='Detail 2',
+                             dorm=True, occupancy=2)
+        session.add(room_type)
+        session.commit()
+        rooms, queries = room_type_queries(event)
+        self.assertEqual((len(rooms), queries), (2, 1))
+
+        room_type.title = 'Renamed'
+        session.commit()
+        rooms, queries = room_type_queries(event)
+        self.assertEqual((sorted(room['title'] for room in rooms), queries), (['Renamed', 'Title 1'], 1))
+
+        session.delete(room_type)
+        session.commit()
+        rooms, queries = room_type_queries(event)
+        self.assertEqual((len(rooms), queries), (1, 1))
+        session.close()
+        room_type_cache.invalidate(email)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,12 +17,12 @@
 # limitations under the License.
 #
 import unittest
+import database
 import index
 import uuid
 
 from controllers import *
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from models import User
@@ -35,11 +35,8 @@ os.environ['DB_PASS'] = ''
 os.environ['DB_HOST'] = 'localhost'
 os.environ['DB_NAME'] = 'test'
 
-mysql = create_engine('mysql+mysqlconnector://' + os.environ['DB_USER'] + ':' +
-                      os.environ['DB_PASS'] + '@' + os.environ['DB_HOST'] + '/' +
-                      os.environ['DB_NAME'], echo=True, isolation_level='READ COMMITTED',
-                      pool_pre_ping=True)
-Session = sessionmaker(bind=mysql)
+engine = database.get_engine(database.PRIMARY)
+Session = sessionmaker(bind=engine)
 
 
 class TestSetupProperty(unittest.TestCase):